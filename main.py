@@ -1,12 +1,13 @@
 import time
 import uuid
+import orjson
 import uvicorn
 import asyncio
 import re
 from contextlib import asynccontextmanager
 from typing import Annotated, Optional
 from urllib.parse import quote
-from fastapi import FastAPI, Depends, HTTPException, Form, Cookie, status, UploadFile, File, Request
+from fastapi import FastAPI, Depends, HTTPException, Form, Cookie, Query, status, UploadFile, File, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from motor.motor_asyncio import AsyncIOMotorCollection
@@ -21,31 +22,52 @@ from src.models import VV_Album, VV_User, SearchResults, AlbumsLayout
 from src.handlers import register_exception_handlers
 from src.lastfm_api.album_info import album_search, album_getinfo
 from src.lastfm_api.artist_info import artist_top_albums
-from src.database import get_users_collection, add_user, is_in_collection, pick_random_username
+from src.lastfm_api.http_client import init_lastfm_http_client, close_lastfm_http_client
 from src.database import get_session_cookies_collection, add_session, init_database, close_database, ping_database
-from src.utils.utils import load_html
+from src.utils.utils import LastFmUnavailableError
 from src.utils.logger import logger
-from src.pages import render_user_page
-from src.cdn.s3_avatars import coalesce_avatar_url, upload_user_avatar_to_s3
-from src.cdn.data_cdn import build_vv_theme_css, patch_html_with_cdn_assets
-from src.utils.avatar_upload import detect_image_content_type, read_upload_up_to
-from src.utils.passwords import hash_password, verify_password
-from src.utils.ttl_cache import TTLCache
+from src.pages import render_user_page, user_page_template_version
+from src.cdn.s3_avatars import AVATAR_VARIANT_SIZES, avatar_srcset, coalesce_avatar_url
+from src.cdn.s3_avatars import upload_user_avatar_variants
+from src.cdn.s3_async import init_s3_client, close_s3_client
+from src.html_templates import load_pages, page_response
+from src.static_assets import build_assets, asset_response, compiled_asset_response, source_asset
+from src.static_assets import THEME_CSS, UNVERSIONED_HEADERS
+from src.utils.http_cache import etag_matches, make_etag, not_modified
+from src.utils.avatar_upload import UploadSizeLimitMiddleware, check_upload
+from src.utils.avatar_images import AvatarImageError, make_avatar_variants, shutdown_avatar_pool
+from src.utils.passwords import hash_password_async, check_password_async, shutdown_password_pool
+from src.utils.passwords import PasswordPoolBusyError
+from src.search_cache import SearchCache, CACHE_MISS
+from src.session_cache import resolve_session, invalidate_session
+from src.users_repository import UsersRepository, AlbumCursorError, get_users_repository
+from src.album_info_cache import get_cached_album_covers, remember_album_covers, remember_search_albums
+from src.utils.single_flight import SingleFlight, lastfm_key
 
 AVATAR_UPLOAD_MAX_BYTES = 5 * 1024 * 1024
-AVATAR_ALLOWED_TYPES = {
-    "image/jpeg": ".jpg",
-    "image/png": ".png",
-    "image/webp": ".webp",
-    "image/gif": ".gif",
-}
+# Пагинация списков альбомов: ?limit=N&after=<album_id последнего альбома предыдущей страницы>
+ALBUMS_PAGE_MAX_LIMIT = 200
+# Столько альбомов /user/{username} отдаёт прямо в странице (как первая страница в script.js)
+USER_PAGE_INITIAL_ALBUMS = 60
+albums_limit_query = Annotated[Optional[int], Query(ge=1, le=ALBUMS_PAGE_MAX_LIMIT)]
+albums_after_query = Annotated[Optional[str], Query(min_length=1)]
+# Любой из них перекодируется в WebP (src/utils/avatar_images.py)
+AVATAR_ALLOWED_TYPES = frozenset({"image/jpeg", "image/png", "image/webp", "image/gif"})
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    build_assets()
+    load_pages()
     await init_database()
+    await init_lastfm_http_client()
+    await init_s3_client()
     yield
+    await close_s3_client()
+    await close_lastfm_http_client()
     await close_database()
+    shutdown_password_pool()
+    shutdown_avatar_pool()
 
 
 app = FastAPI(
@@ -58,16 +80,35 @@ register_exception_handlers(app)
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Слишком большой аватар отсекается до того, как Starlette запишет тело во временный файл
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_re=re.compile(r"^/api/users/[^/]+/avatar$"),
+    max_bytes=AVATAR_UPLOAD_MAX_BYTES,
+)
 
 # Запуск без docker: uvicorn main:app --reload
 
-users_collection_dep = Annotated[AsyncIOMotorCollection, Depends(get_users_collection)]
+users_repo_dep = Annotated[UsersRepository, Depends(get_users_repository)]
 session_cookies_dep = Annotated[AsyncIOMotorCollection, Depends(get_session_cookies_collection)]
 
 SESSION_COOKIES_KEY = 'vv_session_cookie'
 # Поиск открыт и гостям (welcome-страница), поэтому квоту Last.fm берегут лимиты по IP и кэш
-SEARCH_ALBUMS_CACHE = TTLCache(ttl_sec=cfg.SEARCH_CACHE_TTL_SEC)
-SEARCH_MIXED_CACHE = TTLCache(ttl_sec=cfg.SEARCH_CACHE_TTL_SEC)
+SEARCH_ALBUMS_CACHE = SearchCache(
+    "albums", list[VV_Album],
+    ttl_sec=cfg.SEARCH_CACHE_TTL_SEC,
+    stale_ttl_sec=cfg.SEARCH_CACHE_STALE_TTL_SEC,
+    max_size=cfg.SEARCH_CACHE_MAX_SIZE,
+)
+SEARCH_MIXED_CACHE = SearchCache(
+    "mixed", SearchResults,
+    ttl_sec=cfg.SEARCH_CACHE_TTL_SEC,
+    stale_ttl_sec=cfg.SEARCH_CACHE_STALE_TTL_SEC,
+    max_size=cfg.SEARCH_CACHE_MAX_SIZE,
+)
+# Одинаковые запросы в Last.fm, пришедшие одновременно, ждут один ответ
+LASTFM_INFLIGHT = SingleFlight()
+BACKGROUND_TASKS: set[asyncio.Task] = set()
 PUBLIC_USERNAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
 RESERVED_PROFILE_PATHS = {
     "",
@@ -82,23 +123,66 @@ def _cookie_secure(request: Request) -> bool:
     return cfg.COOKIE_SECURE or request.url.scheme == "https"
 
 
-async def verify_login_password(username: str, password: str,
-                                users_collection: users_collection_dep) -> Optional[VV_User]:
+async def verify_login_password(username: str, password: str, users: UsersRepository) -> Optional[VV_User]:
     """ Проверяет логин и пароль пользователя и возвращает пользователя из базы данных. """
-    user_doc = await users_collection.find_one({"username": username})
-    if not user_doc or not verify_password(password, user_doc.get("password", "")):
+    user_doc = await users.get_auth_record(username)
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="Invalid login or password")
+    stored_hash = user_doc.get("password", "")
+    prehashed = bool(user_doc.get("password_prehashed"))
+    is_valid, needs_rehash = await check_password_async(password, stored_hash, legacy_possible=not prehashed)
+    if not is_valid:
         raise HTTPException(status_code=401, detail="Invalid login or password")
+    if needs_rehash or not prehashed:
+        _run_in_background(_upgrade_password_hash(
+            users, user_doc["user_id"], password, stored_hash, rehash=needs_rehash,
+        ))
     return VV_User.model_validate(user_doc)
 
 
+async def _upgrade_password_hash(
+    users: UsersRepository,
+    user_id: str,
+    password: str,
+    old_hash: str,
+    rehash: bool,
+) -> None:
+    """ Старый формат или стоимость хэша: перехэшируем и помечаем запись, чтобы следующий вход стоил один checkpw. """
+    update: dict = {"password_prehashed": True}
+    try:
+        if rehash:
+            update["password"] = await hash_password_async(password)
+        await users.upgrade_password(user_id, old_hash, update)
+        logger.debug(f"Хэш пароля обновлён ({user_id=}, {rehash=})")
+    except Exception:
+        logger.exception("Не удалось обновить хэш пароля")
+
+
+def _run_in_background(coro) -> None:
+    """ Фоновая задача без ожидания; ссылку держим до завершения, иначе её может собрать GC. """
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+
 def generate_session_id() -> str:
     """ Генерация случайного id сессии """
     return str(uuid.uuid4().hex) + str(time.time_ns())
 
 
-async def get_session_data(
+async def get_optional_session(
     session_cookies_collection: session_cookies_dep,
     session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
+) -> dict:
+    """ Сессия по Cookie или {} для гостя. FastAPI считает зависимость один раз на запрос. """
+    if not session_id:
+        return {}
+    return await resolve_session(session_cookies_collection, session_id)
+
+
+async def get_session_data(
+    session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
+    session: dict = Depends(get_optional_session),
 ) -> dict:
     """ Получить информацию о сессии по Cookie """
     logger.debug("Получил куку сессии" if session_id else "Куки сессии нет")
@@ -107,8 +191,7 @@ async def get_session_data(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
-    session = await session_cookies_collection.find_one({'session_id': session_id})
-    return session or {}
+    return session
 
 
 async def _cookie_create_and_set(
@@ -147,23 +230,31 @@ def _is_public_profile_username(username: str) -> bool:
 
 @app.post("/register", response_class=HTMLResponse)
 @limiter.limit("5/minute")
-async def register(request: Request, users_collection: users_collection_dep, session_cookies: session_cookies_dep,
+async def register(request: Request, users: users_repo_dep, session_cookies: session_cookies_dep,
                    username: str = Form(...), password: str = Form(...), email: EmailStr = Form(...)):
     """ Обработчик регистрации. Принимает данные из HTML-формы и добавляет нового пользователя в базу данных. """
     if not _is_public_profile_username(username):
         return RedirectResponse(url="/register?error=badusername", status_code=303)
     if not password.strip():
         return RedirectResponse(url="/register?error=password", status_code=303)
-    if await is_in_collection(field='username', value=username, collection=users_collection):
+    if await users.username_exists(username):
         return RedirectResponse(url="/register?error=exists", status_code=303)
-    if await is_in_collection(field='email', value=str(email), collection=users_collection):
+    if await users.email_exists(str(email)):
         return RedirectResponse(url="/register?error=emailused", status_code=303)
     try:
-        user = VV_User(username=username, password=hash_password(password), email=email)
-        new_user = await add_user(users_collection, user)
+        user = VV_User(
+            username=username,
+            password=await hash_password_async(password),
+            password_prehashed=True,
+            email=email,
+        )
+        new_user = await users.insert(user)
         logger.debug(f'New user is created: {new_user}')
     except DuplicateKeyError:
         return RedirectResponse(url="/register?error=exists", status_code=303)
+    except PasswordPoolBusyError:
+        logger.warning("Очередь bcrypt переполнена, регистрация отклонена")
+        return RedirectResponse(url="/register?error=busy", status_code=303)
     except Exception:
         logger.exception("Ошибка при регистрации пользователя")
         return RedirectResponse(url="/register?error=server", status_code=303)
@@ -174,17 +265,20 @@ async def register(request: Request, users_collection: users_collection_dep, ses
 
 @app.post("/login")
 @limiter.limit("10/minute")
-async def login(request: Request, users_collection: users_collection_dep, session_cookies: session_cookies_dep,
+async def login(request: Request, users: users_repo_dep, session_cookies: session_cookies_dep,
                 username: str = Form(...), password: str = Form(...)):
     """ Обработчик логина. Принимает данные из HTML-формы и возвращает пользователя из базы данных. """
     if not password.strip():
         return RedirectResponse(url="/login?error=invalid", status_code=303)
     try:
-        user = await verify_login_password(username, password, users_collection)
+        user = await verify_login_password(username, password, users)
     except HTTPException as exc:
         if exc.status_code == 401:
             return RedirectResponse(url="/login?error=invalid", status_code=303)
         raise
+    except PasswordPoolBusyError:
+        logger.warning("Очередь bcrypt переполнена, вход отклонён")
+        return RedirectResponse(url="/login?error=busy", status_code=303)
     # Создаем сессию и устанавливаем cookie, чтобы /me открыл страницу текущего пользователя
     response = await _cookie_create_and_set(session_cookies=session_cookies, user=user, request=request)
     return response
@@ -197,6 +291,7 @@ async def logout(request: Request, session_cookies: session_cookies_dep,
     if session_id:
         # Удаляем сессию из базы данных
         await session_cookies.delete_one({'session_id': session_id})
+        invalidate_session(session_id)
         logger.debug("Удалена сессия")
 
     # Создаем ответ с редиректом на welcome и очищаем cookie
@@ -231,17 +326,11 @@ async def my_page(
 @limiter.limit("30/minute")
 async def random_user_page(
     request: Request,
-    users_collection: users_collection_dep,
-    session_cookies_collection: session_cookies_dep,
-    session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
+    users: users_repo_dep,
+    session: dict = Depends(get_optional_session),
 ):
     """ Редирект на профиль случайного пользователя (свой профиль пропускаем). """
-    exclude_username = None
-    if session_id:
-        session = await session_cookies_collection.find_one({'session_id': session_id}) or {}
-        exclude_username = session.get("username")
-
-    username = await pick_random_username(users_collection, exclude_username=exclude_username)
+    username = await users.pick_random_username(exclude_username=session.get("username"))
     if not username:
         logger.debug("Случайный пользователь не найден")
         return RedirectResponse(url="/welcome", status_code=303)
@@ -251,54 +340,71 @@ async def random_user_page(
 
 @app.get("/user/{username}", response_class=HTMLResponse)
 async def user_page_by_username(
+    request: Request,
     username: str,
-    users_collection: users_collection_dep,
-    session_cookies_collection: session_cookies_dep,
-    session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
+    users: users_repo_dep,
+    session_data: dict = Depends(get_optional_session),
 ):
-    """ Публичная страница пользователя по username. """
-    user_doc = await users_collection.find_one({"username": username})
-    if not user_doc:
+    """
+        Публичная страница пользователя по username. Шапка профиля и первая страница альбомов
+        приходят одним запросом в Mongo и встраиваются в страницу: карточками и JSON для script.js.
+    """
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Cookie"}
+    is_authenticated = bool(session_data)
+
+    def page_etag(doc: dict) -> str:
+        # Страница зависит от ревизии профиля, от того, кто смотрит, и от шаблона с адресами CDN
+        is_owner = session_data.get("user_id") == doc["user_id"]
+        viewer = "owner" if is_owner else "user" if is_authenticated else "guest"
+        return make_etag(doc["user_id"], doc.get("revision", 0), viewer, user_page_template_version())
+
+    if request.headers.get("if-none-match"):
+        # Проверка кэша браузера: хватает шапки профиля, альбомы не читаем
+        header = await users.get_profile_header_by_username(username)
+        if header and etag_matches(request, page_etag(header)):
+            return not_modified(page_etag(header), headers)
+
+    page = await users.get_profile_page(username, limit=USER_PAGE_INITIAL_ALBUMS)
+    if page is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
 
-    session_data = {}
-    if session_id:
-        session_data = await session_cookies_collection.find_one({'session_id': session_id}) or {}
-
-    avatar_url = coalesce_avatar_url(user_doc.get("avatar_url"))
+    is_owner = session_data.get("user_id") == page["user_id"]
+    avatar_url = coalesce_avatar_url(page.get("avatar_url"))
+    initial_data = {
+        "profile": {
+            "user_id": page["user_id"],
+            "username": page["username"],
+            "avatar_url": avatar_url,
+            "avatar_srcset": avatar_srcset(avatar_url),
+            "profile_path": _build_profile_path(page["username"]),
+        },
+        "albums": page["albums"],
+        "total": page["total"],
+        "next_after": page["albums"][-1]["album_id"] if page["has_more"] and page["albums"] else None,
+    }
     content = render_user_page(
-        username=user_doc["username"],
+        username=page["username"],
         avatar_url=avatar_url,
-        is_owner=session_data.get("user_id") == user_doc.get("user_id"),
-        is_authenticated=bool(session_data),
+        is_owner=is_owner,
+        is_authenticated=is_authenticated,
+        albums=page["albums"],
+        initial_data=initial_data,
     )
-
-    headers = {
-        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-        "Pragma": "no-cache",
-        "Expires": "0",
-    }
-    return HTMLResponse(content=content, headers=headers)
+    return HTMLResponse(content=content, headers={**headers, "ETag": page_etag(page)})
 
 
 # _____________________________ HTMLResponse _____________________________
 
 @app.get("/", response_class=HTMLResponse)
-async def default_page(
-    session_cookies_collection: session_cookies_dep,
-    session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
-):
-    if session_id:
-        session = await session_cookies_collection.find_one({'session_id': session_id})
-        if session:
-            return RedirectResponse(url=_build_profile_path(session["username"]), status_code=303)
+async def default_page(session: dict = Depends(get_optional_session)):
+    if session:
+        return RedirectResponse(url=_build_profile_path(session["username"]), status_code=303)
     return RedirectResponse(url="/welcome", status_code=303)
 
 
 @app.get("/welcome", response_class=HTMLResponse)
-async def welcome_page():
-    content = patch_html_with_cdn_assets(load_html("welcome.html", cfg.WEBSITE_DIR))
-    return HTMLResponse(content=content)
+async def welcome_page(request: Request):
+    return page_response(request, "welcome.html")
 
 
 @app.api_route("/explore", methods=["GET", "POST"])
@@ -309,86 +415,99 @@ async def explore(session_data: dict = Depends(get_session_data)):
 
 
 @app.get("/register", response_class=HTMLResponse)
-async def register_page():
-    content = patch_html_with_cdn_assets(load_html("register.html", cfg.WEBSITE_DIR))
-    return HTMLResponse(content=content)
+async def register_page(request: Request):
+    return page_response(request, "register.html")
 
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page():
-    content = patch_html_with_cdn_assets(load_html("login.html", cfg.WEBSITE_DIR))
-    return HTMLResponse(content=content)
+async def login_page(request: Request):
+    return page_response(request, "login.html")
+
+
+@app.get("/assets/{filename}")
+async def static_asset(request: Request, filename: str):
+    """ script.js, styles.css, form-error.js с хэшем в имени: сжаты заранее и кэшируются навсегда. """
+    return asset_response(request, filename)
 
 
 @app.get("/static/vv-data-theme.css")
-async def vv_data_theme_css():
-    """Переменные фона/плейсхолдера с CDN (подключается до styles.css)."""
-    return Response(content=build_vv_theme_css(), media_type="text/css; charset=utf-8")
+async def vv_data_theme_css(request: Request):
+    """
+        Переменные фона/плейсхолдера с CDN (подключается до styles.css). Собраны при старте;
+        страницы ссылаются на /assets/vv-data-theme.<hash>.css, этот адрес — для старых страниц и разработки.
+    """
+    return compiled_asset_response(request, source_asset(THEME_CSS), UNVERSIONED_HEADERS)
 
 
 # ____________________________________ API ____________________________________
 
+def _album_from_lastfm(x: dict, artist_name: str) -> VV_Album:
+    images = x.get("image") or []
+    return VV_Album.model_validate({
+        "album_name": x.get("name", ""),
+        "artist_name": artist_name or "",
+        "cover_url": (images[-1] or {}).get("#text", "") if images else "",
+        "cover_url_reserve": (images[-2] or {}).get("#text", "") if len(images) > 1 else "",
+    })
+
+
+async def _fetch_album_search(album_name: str) -> list[VV_Album]:
+    search_results = await LASTFM_INFLIGHT.run(
+        lastfm_key("album.search", album_name),
+        lambda: album_search(album_name),
+    )
+    albums = [_album_from_lastfm(x, x.get("artist", "")) for x in search_results]
+    _run_in_background(remember_search_albums(albums))
+    return albums
+
+
+async def _fetch_search_mixed(query: str) -> SearchResults:
+    # Асинхронно запускаем оба запроса к внешнему API
+    album_search_results, artist_top_results = await asyncio.gather(
+        LASTFM_INFLIGHT.run(lastfm_key("album.search", query), lambda: album_search(query)),
+        LASTFM_INFLIGHT.run(lastfm_key("artist.getTopAlbums", query), lambda: artist_top_albums(query)),
+    )
+    albums_group = [_album_from_lastfm(x, x.get("artist", "")) for x in album_search_results]
+
+    # структура top_albums: { name, artist: { name }, image: [...] }
+    artist_group: list[VV_Album] = []
+    for x in artist_top_results or []:
+        artist_name = x.get("artist", {}).get("name") if isinstance(x.get("artist"), dict) else x.get("artist", "")
+        artist_group.append(_album_from_lastfm(x, artist_name))
+
+    _run_in_background(remember_search_albums(albums_group + artist_group))
+    return SearchResults(albums=albums_group, artist_top_albums=artist_group)
+
+
 @app.get("/api/search/albums/{album_name}", response_model=list[VV_Album])
 @limiter.limit("20/minute")
-async def search_album(request: Request, album_name: str):
+async def search_album(request: Request, response: Response, album_name: str):
     """ Возвращает список найденных альбомов по запросу пользователя (legacy для фронта) """
-    cached = SEARCH_ALBUMS_CACHE.get(album_name.strip().lower())
-    if cached is not None:
-        return cached
-
-    search_results = await album_search(album_name)
-    albums: list[VV_Album] = []
-    for x in search_results:
-        albums.append(VV_Album.model_validate({
-            "album_name": x.get("name", ""),
-            "artist_name": x.get("artist", ""),
-            "cover_url": (x.get("image", [])[-1] or {}).get("#text", "") if x.get("image") else "",
-            "cover_url_reserve": (x.get("image", [])[-2] or {}).get("#text", "") if x.get("image") and len(
-                x.get("image")) > 1 else ""
-        }))
-    SEARCH_ALBUMS_CACHE.set(album_name.strip().lower(), albums)
+    try:
+        albums, cache_status = await SEARCH_ALBUMS_CACHE.get_or_fetch(
+            album_name.strip().lower(),
+            lambda: _fetch_album_search(album_name),
+        )
+    except LastFmUnavailableError as exc:
+        logger.warning(f"Last.fm недоступен, поиск альбомов пуст: {exc}")
+        albums, cache_status = [], CACHE_MISS
+    response.headers["X-Cache"] = cache_status
     return albums
 
 
 @app.get("/api/search/mixed/{query}", response_model=SearchResults)
 @limiter.limit("30/minute")
-async def search_mixed(request: Request, query: str):
+async def search_mixed(request: Request, response: Response, query: str):
     """ Выполняет параллельный поиск: по имени альбома и по топ-альбомам исполнителя. Возвращает сгруппировано. """
-    cached = SEARCH_MIXED_CACHE.get(query.strip().lower())
-    if cached is not None:
-        return cached
-
-    # Асинхронно запускаем оба запроса к внешнему API
-    album_search_results, artist_top_results = await asyncio.gather(
-        album_search(query),
-        artist_top_albums(query)
-    )
-    albums_group: list[VV_Album] = []
-    for x in album_search_results:
-        albums_group.append(VV_Album.model_validate({
-            "album_name": x.get("name", ""),
-            "artist_name": x.get("artist", ""),
-            "cover_url": (x.get("image", [])[-1] or {}).get("#text", "") if x.get("image") else "",
-            "cover_url_reserve": (x.get("image", [])[-2] or {}).get("#text", "") if x.get("image") and len(
-                x.get("image")) > 1 else ""
-        }))
-
-    # artist_top_albums
-    artist_group: list[VV_Album] = []
-    if artist_top_results:
-        for x in artist_top_results:
-            # структура top_albums: { name, artist: { name }, image: [...] }
-            artist_name = x.get("artist", {}).get("name") if isinstance(x.get("artist"), dict) else x.get("artist", "")
-            artist_group.append(VV_Album.model_validate({
-                "album_name": x.get("name", ""),
-                "artist_name": artist_name or "",
-                "cover_url": (x.get("image", [])[-1] or {}).get("#text", "") if x.get("image") else "",
-                "cover_url_reserve": (x.get("image", [])[-2] or {}).get("#text", "") if x.get("image") and len(
-                    x.get("image")) > 1 else ""
-            }))
-
-    results = SearchResults(albums=albums_group, artist_top_albums=artist_group)
-    SEARCH_MIXED_CACHE.set(query.strip().lower(), results)
+    try:
+        results, cache_status = await SEARCH_MIXED_CACHE.get_or_fetch(
+            query.strip().lower(),
+            lambda: _fetch_search_mixed(query),
+        )
+    except LastFmUnavailableError as exc:
+        logger.warning(f"Last.fm недоступен, смешанный поиск пуст: {exc}")
+        results, cache_status = SearchResults(), CACHE_MISS
+    response.headers["X-Cache"] = cache_status
     return results
 
 
@@ -396,40 +515,47 @@ async def search_mixed(request: Request, query: str):
 async def add_album(
     user_id: str,
     album: VV_Album,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
 ):
     """
         Добавляет альбом в базу пользователя:
         1) инициализирует объект VV_Album (из параметров id, artist, album)
-        2) находит через api доп. информацию по альбому
+        2) находит доп. информацию по альбому: в кэше обложек, иначе через api
         3) добавляет к VV_Album найденную информацию (cover urls)
-        4) устанавливает порядок альбома (последний в списке)
-        5) добавляет альбом в DB
+        4) одной записью в DB ставит порядок (последний в списке) и добавляет альбом,
+           если такой пары (artist, album) ещё нет в коллекции
     """
     # Проверяем, что user_id из URL соответствует user_id из сессии
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    raw = await album_getinfo(artist_name=album.artist_name, album_name=album.album_name)
-    album_info = raw.get("album") if isinstance(raw, dict) else None
-    if not album_info:
-        detail = raw.get("error", "Альбом не найден в Last.fm") if isinstance(raw, dict) else "Альбом не найден в Last.fm"
-        raise HTTPException(status_code=404, detail=detail)
-
-    images = album_info.get("image") or []
-    album.cover_url = (images[-1] or {}).get("#text", "") if images else ""
-    album.cover_url_reserve = (images[-2] or {}).get("#text", "") if len(images) > 1 else ""
+    covers = await get_cached_album_covers(album.artist_name, album.album_name)
+    if covers is None:
+        raw = await LASTFM_INFLIGHT.run(
+            lastfm_key("album.getInfo", album.artist_name, album.album_name),
+            lambda: album_getinfo(artist_name=album.artist_name, album_name=album.album_name),
+        )
+        album_info = raw.get("album") if isinstance(raw, dict) else None
+        if not album_info:
+            detail = raw.get("error", "Альбом не найден в Last.fm") if isinstance(raw, dict) else "Альбом не найден в Last.fm"
+            raise HTTPException(status_code=404, detail=detail)
+
+        images = album_info.get("image") or []
+        covers = (
+            (images[-1] or {}).get("#text", "") if images else "",
+            (images[-2] or {}).get("#text", "") if len(images) > 1 else "",
+        )
+        await remember_album_covers(album.artist_name, album.album_name, *covers)
+    album.cover_url, album.cover_url_reserve = covers
 
-    # Получаем текущее количество альбомов пользователя для установки порядка
-    user = await users_collection.find_one({"user_id": user_id})
-    current_album_count = len(user.get("albums", [])) if user else 0
-    album.order = current_album_count
+    order = await users.append_album(user_id, album)
+    if order is None:
+        if not await users.user_exists(user_id):
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        raise HTTPException(status_code=409, detail="Альбом уже есть в коллекции")
 
-    await users_collection.update_one(
-        filter={"user_id": user_id},
-        update={"$push": {"albums": album.model_dump()}}
-    )
+    album.order = order
     return {"message": "Альбом добавлен", "album": album}
 
 
@@ -437,7 +563,7 @@ async def add_album(
 async def delete_album(
     user_id: str,
     album_id: str,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
 ):
     """ Удаляет альбом из базы пользователя """
@@ -445,81 +571,97 @@ async def delete_album(
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    result = await users_collection.update_one(
-        filter={"user_id": user_id},
-        update={"$pull": {"albums": {"album_id": album_id}}}
-    )
-    if result.modified_count == 0:
+    if not await users.delete_album(user_id, album_id):
         raise HTTPException(status_code=404, detail="Альбом не найден или не удален")
     return {"message": "Альбом удален", "album": album_id}
 
 
+def _albums_json_response(page: dict, headers: Optional[dict[str, str]] = None) -> Response:
+    """
+        Альбомы из Mongo уже отсортированы и приведены к полям VV_Album (проверка была при записи),
+        поэтому отдаём их сразу байтами, минуя валидацию response_model.
+        X-Total-Count — размер всей коллекции; X-Next-After — курсор следующей страницы, если она есть.
+    """
+    albums = page["albums"]
+    headers = {**(headers or {}), "X-Total-Count": str(page["total"])}
+    if page["has_more"] and albums:
+        headers["X-Next-After"] = albums[-1]["album_id"]
+    return Response(content=orjson.dumps(albums), media_type="application/json", headers=headers)
+
+
+async def _get_albums_page(load, key: str, limit: Optional[int], after: Optional[str]) -> Optional[dict]:
+    try:
+        return await load(key, limit=limit, after=after)
+    except AlbumCursorError:
+        raise HTTPException(status_code=400, detail="Курсор устарел: загрузите список заново")
+
+
 @app.get("/api/users/{user_id}/albums/all/", response_model=list[VV_Album])
 async def get_user_albums(
     user_id: str,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
+    limit: albums_limit_query = None,
+    after: albums_after_query = None,
     session_data: dict = Depends(get_session_data),
 ):
-    """ Возвращает список альбомов пользователя из базы, отсортированных по порядку """
+    """ Возвращает список альбомов пользователя из базы, отсортированных по порядку (без limit — весь) """
     logger.info(f"{user_id=}")
 
     # Проверяем, что user_id из URL соответствует user_id из сессии
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    user: dict = await users_collection.find_one({"user_id": user_id})
-
-    if user:
-        albums = VV_User.model_validate(user).albums
-        # Сортируем альбомы по полю order
-        albums.sort(key=lambda x: x.order)
-        return albums
-    return []
+    page = await _get_albums_page(users.get_sorted_albums_by_id, user_id, limit, after)
+    return _albums_json_response(page or {"albums": [], "total": 0, "has_more": False})
 
 
 @app.put("/api/users/{user_id}/albums/reorder/")
 async def reorder_albums(
     user_id: str,
     album_orders: list[dict],
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
 ):
-    """ Обновляет порядок альбомов пользователя """
+    """
+        Обновляет порядок альбомов пользователя одной атомарной записью и возвращает новый порядок.
+        Если хоть одного album_id нет в коллекции, не меняется ничего.
+    """
     logger.info(f"Reordering albums for user_id: {user_id!r}")
 
     # Проверяем, что user_id из URL соответствует user_id из сессии
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
-    
+
     # Валидируем входные данные
     if not album_orders:
         raise HTTPException(status_code=400, detail="Список порядков альбомов не может быть пустым")
-    
-    # Обновляем порядок каждого альбома
+
+    orders: dict[str, int] = {}
     for album_order in album_orders:
         album_id = album_order.get("album_id")
         new_order = album_order.get("order")
-        
-        if album_id is None or new_order is None:
+
+        if not isinstance(album_id, str) or not isinstance(new_order, int) or isinstance(new_order, bool):
             raise HTTPException(status_code=400, detail="Неверный формат данных: требуется album_id и order")
-        
-        # Обновляем порядок конкретного альбома
-        result = await users_collection.update_one(
-            filter={"user_id": user_id, "albums.album_id": album_id},
-            update={"$set": {"albums.$.order": new_order}}
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail=f"Альбом с ID {album_id} не найден")
-    
-    return {"message": "Порядок альбомов успешно обновлен"}
+        if album_id in orders:
+            raise HTTPException(status_code=400, detail=f"Альбом с ID {album_id} указан дважды")
+        orders[album_id] = new_order
+
+    stored_albums = await users.set_album_orders(user_id, orders)
+    if stored_albums is None:
+        stored_ids = await users.get_album_ids(user_id)
+        missing = next((album_id for album_id in orders if album_id not in stored_ids), None)
+        raise HTTPException(status_code=404, detail=f"Альбом с ID {missing} не найден")
+
+    albums = sorted(stored_albums, key=lambda album: album.get("order", 0))
+    return {"message": "Порядок альбомов успешно обновлен", "albums": albums}
 
 
 @app.put("/api/users/{user_id}/albums/layout/", response_model=list[VV_Album])
 async def save_albums_layout(
     user_id: str,
     layout: AlbumsLayout,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
 ):
     """
@@ -529,11 +671,11 @@ async def save_albums_layout(
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    user_doc = await users_collection.find_one({"user_id": user_id})
+    user_doc = await users.get_albums_by_id(user_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    albums = VV_User.model_validate(user_doc).albums
+    albums = [VV_Album.model_validate(album) for album in user_doc.get("albums", [])]
     deleted = set(layout.deleted_album_ids)
     kept = [album for album in albums if album.album_id not in deleted]
 
@@ -543,27 +685,16 @@ async def save_albums_layout(
     for index, album in enumerate(kept):
         album.order = index
 
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {"$set": {"albums": [album.model_dump() for album in kept]}},
-    )
+    await users.replace_albums(user_id, kept)
     logger.debug(f"Сохранена коллекция: удалено {len(albums) - len(kept)}, осталось {len(kept)}")
     return kept
 
 
 @app.get("/api/auth/check")
-async def check_auth(
-    session_cookies_collection: session_cookies_dep,
-    session_id: Optional[str] = Cookie(alias=SESSION_COOKIES_KEY, default=None),
-):
+async def check_auth(session: dict = Depends(get_optional_session)):
     """ Проверяет статус авторизации пользователя. Возвращает is_authenticated: true/false """
     logger.debug("Проверка авторизации")
-    if not session_id:
-        return {"is_authenticated": False}
-    session = await session_cookies_collection.find_one({'session_id': session_id})
-    if session:
-        return {"is_authenticated": True}
-    return {"is_authenticated": False}
+    return {"is_authenticated": bool(session)}
 
 
 @app.get("/api/me/userid")
@@ -577,7 +708,7 @@ async def get_current_user_id(session_data: dict = Depends(get_session_data)):
 
 @app.get("/api/me/profile")
 async def get_current_user_profile(
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
 ):
     """ Профиль текущего пользователя: имя и URL аватара (для отображения на странице /me). """
@@ -585,14 +716,16 @@ async def get_current_user_profile(
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated")
 
-    user_doc = await users_collection.find_one({"user_id": user_id})
+    user_doc = await users.get_profile_header_by_id(user_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
+    avatar_url = coalesce_avatar_url(user_doc.get("avatar_url"))
     return {
         "user_id": user_id,
         "username": user_doc.get("username", session_data.get("username", "")),
-        "avatar_url": coalesce_avatar_url(user_doc.get("avatar_url")),
+        "avatar_url": avatar_url,
+        "avatar_srcset": avatar_srcset(avatar_url),
         "profile_path": _build_profile_path(user_doc.get("username", session_data.get("username", ""))),
     }
 
@@ -600,40 +733,58 @@ async def get_current_user_profile(
 @app.get("/api/profiles/{username}")
 async def get_public_user_profile(
     username: str,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
 ):
     """ Публичный профиль пользователя по username. """
-    user_doc = await users_collection.find_one({"username": username})
+    user_doc = await users.get_profile_header_by_username(username)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
+    avatar_url = coalesce_avatar_url(user_doc.get("avatar_url"))
     return {
         "user_id": user_doc["user_id"],
         "username": user_doc["username"],
-        "avatar_url": coalesce_avatar_url(user_doc.get("avatar_url")),
+        "avatar_url": avatar_url,
+        "avatar_srcset": avatar_srcset(avatar_url),
         "profile_path": _build_profile_path(user_doc["username"]),
     }
 
 
 @app.get("/api/profiles/{username}/albums", response_model=list[VV_Album])
 async def get_public_user_albums(
+    request: Request,
     username: str,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
+    limit: albums_limit_query = None,
+    after: albums_after_query = None,
 ):
-    """ Возвращает публичный список альбомов пользователя по username. """
-    user_doc = await users_collection.find_one({"username": username})
-    if not user_doc:
+    """
+        Возвращает публичный список альбомов пользователя по username (без limit — весь).
+        ETag — ревизия коллекции: пока она не изменилась, повторный запрос получает 304 без чтения альбомов.
+        Шапку профиля читаем только для условного запроса, обычный обходится одним запросом в Mongo.
+    """
+    headers = {"Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match"):
+        # Проверка кэша браузера: хватает шапки профиля, альбомы не читаем
+        header = await users.get_profile_header_by_username(username)
+        if header is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        etag = make_etag(header["user_id"], header.get("revision", 0))
+        if etag_matches(request, etag):
+            return not_modified(etag, headers)
+
+    page = await _get_albums_page(users.get_sorted_albums_by_username, username, limit, after)
+    if page is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-
-    albums = VV_User.model_validate(user_doc).albums
-    albums.sort(key=lambda x: x.order)
-    return albums
+    # ETag по ревизии из той же выборки, что и альбомы: запись между двумя запросами не спутает версии
+    headers["ETag"] = make_etag(page["user_id"], page["revision"])
+    return _albums_json_response(page, headers)
 
 
 @app.post("/api/users/{user_id}/avatar")
 async def upload_user_avatar(
     user_id: str,
-    users_collection: users_collection_dep,
+    users: users_repo_dep,
     session_data: dict = Depends(get_session_data),
     file: UploadFile = File(...),
 ):
@@ -641,18 +792,20 @@ async def upload_user_avatar(
     if session_data.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    data = await read_upload_up_to(file, AVATAR_UPLOAD_MAX_BYTES)
-    content_type = detect_image_content_type(data)
+    # Файл уже во временном файле Starlette (тело ограничено UploadSizeLimitMiddleware):
+    # проверяем точный размер и сигнатуру, в память целиком не читаем
+    content_type = await check_upload(file, AVATAR_UPLOAD_MAX_BYTES)
     if content_type is None or content_type not in AVATAR_ALLOWED_TYPES:
         raise HTTPException(status_code=400, detail="Файл не является допустимым изображением")
 
-    ext = AVATAR_ALLOWED_TYPES[content_type]
-    avatar_url = await upload_user_avatar_to_s3(user_id, data, content_type, ext)
-    await users_collection.update_one(
-        {"user_id": user_id},
-        {"$set": {"avatar_url": avatar_url}},
-    )
-    return {"avatar_url": avatar_url}
+    # Квадратные WebP нескольких размеров без EXIF
+    try:
+        variants = await make_avatar_variants(file.file, AVATAR_VARIANT_SIZES)
+    except AvatarImageError:
+        raise HTTPException(status_code=400, detail="Файл не является допустимым изображением")
+    avatar_url = await upload_user_avatar_variants(user_id, variants)
+    await users.set_avatar_url(user_id, avatar_url)
+    return {"avatar_url": avatar_url, "avatar_srcset": avatar_srcset(avatar_url)}
 
 
 @app.get("/health")
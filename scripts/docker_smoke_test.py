@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import io
+import re
 import subprocess
 import sys
 import uuid
@@ -11,6 +12,8 @@ import httpx
 
 BASE = "http://127.0.0.1:8000"
 TIMEOUT = 30.0
+# Статика с отпечатком содержимого: /assets/script.<hash>.js
+HASHED_SCRIPT_RE = re.compile(r"/assets/script\.[0-9a-f]+\.js")
 
 # Уборка идёт внутри контейнера app: у него есть доступ к Mongo по внутренней сети и ключи S3
 CLEANUP_CODE = """
@@ -142,10 +145,23 @@ def run_checks(username: str, state: dict) -> None:
     )
 
     r = auth.get("/me")
-    if r.status_code != 200 or "page-type" not in r.text or username not in r.text or "/static/script.js" not in r.text:
-        fail("/me", f"status={r.status_code}")
+    script_match = HASHED_SCRIPT_RE.search(r.text)
+    if r.status_code != 200 or "page-type" not in r.text or username not in r.text or not script_match:
+        fail("/me", f"status={r.status_code}, script={script_match}")
     ok("GET /me")
 
+    script_url = script_match.group(0)
+    r = client.get(script_url)
+    etag = r.headers.get("etag")
+    if r.status_code != 200 or "immutable" not in r.headers.get("cache-control", "") or not etag:
+        fail("hashed asset", f"status={r.status_code}, cache-control={r.headers.get('cache-control')}, etag={etag}")
+    ok(f"GET {script_url} (Cache-Control: immutable)")
+
+    r = client.get(script_url, headers={"If-None-Match": etag})
+    if r.status_code != 304:
+        fail("hashed asset 304", f"status={r.status_code}")
+    ok("повторный запрос статики с ETag -> 304")
+
     r = client.get(f"/user/{username}")
     if r.status_code != 200 or username not in r.text:
         fail("public profile page", f"status={r.status_code}")
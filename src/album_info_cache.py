@@ -0,0 +1,133 @@
+"""Кэш обложек альбомов (album.getInfo) в Mongo: популярный альбом добавляется без запроса в Last.fm.
+
+Ключ — нормализованная пара (artist, album). Запись приходит из album.getInfo или из результатов поиска,
+где обложки уже есть. Запись из getInfo главнее: поиск не перезаписывает её, а только дополняет пустые ключи.
+
+Сброс записи вручную:
+    python -m src.album_info_cache "<artist>" "<album>"
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from src.config import cfg
+from src.database import close_database, get_album_info_collection, init_database
+from src.models import VV_Album
+from src.utils.logger import logger
+from src.utils.ttl_cache import TTLCache
+
+# L1 живёт недолго, чтобы ручной сброс в Mongo доходил до работающих воркеров за минуты
+ALBUM_INFO_L1_TTL_SEC = 600
+ALBUM_INFO_L1 = TTLCache(ttl_sec=ALBUM_INFO_L1_TTL_SEC, max_size=2000)
+
+SOURCE_GETINFO = "getinfo"
+SOURCE_SEARCH = "search"
+
+
+def album_info_key(artist_name: str, album_name: str) -> str:
+    return f"{artist_name.strip().lower()}\x1f{album_name.strip().lower()}"
+
+
+def _expires_at() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=cfg.ALBUM_INFO_CACHE_TTL_SEC)
+
+
+async def get_cached_album_covers(artist_name: str, album_name: str) -> Optional[tuple[str, str]]:
+    """(cover_url, cover_url_reserve) из кэша или None."""
+    key = album_info_key(artist_name, album_name)
+    covers = ALBUM_INFO_L1.get(key)
+    if covers is not None:
+        return covers
+    try:
+        collection = await get_album_info_collection()
+        doc = await collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"cover_url": 1, "cover_url_reserve": 1},
+        )
+    except Exception as exc:
+        logger.warning(f"Кэш альбомов в Mongo недоступен: {exc}")
+        return None
+    if not doc or not doc.get("cover_url"):
+        return None
+    covers = (doc["cover_url"], doc.get("cover_url_reserve", ""))
+    ALBUM_INFO_L1.set(key, covers)
+    return covers
+
+
+async def remember_album_covers(artist_name: str, album_name: str, cover_url: str, cover_url_reserve: str) -> None:
+    """Запись из album.getInfo: перезаписывает всё, что было по ключу."""
+    key = album_info_key(artist_name, album_name)
+    ALBUM_INFO_L1.set(key, (cover_url, cover_url_reserve))
+    try:
+        collection = await get_album_info_collection()
+        await collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "artist_name": artist_name,
+                "album_name": album_name,
+                "cover_url": cover_url,
+                "cover_url_reserve": cover_url_reserve,
+                "source": SOURCE_GETINFO,
+                "expires_at": _expires_at(),
+            }},
+            upsert=True,
+        )
+    except Exception as exc:
+        logger.warning(f"Не удалось записать кэш альбома в Mongo: {exc}")
+
+
+async def remember_search_albums(albums: list[VV_Album]) -> None:
+    """Запись из результатов поиска одним bulk-запросом; существующие записи не трогаем."""
+    operations = []
+    for album in albums:
+        if not album.cover_url or not album.artist_name or not album.album_name:
+            continue
+        operations.append(UpdateOne(
+            {"_id": album_info_key(album.artist_name, album.album_name)},
+            {"$setOnInsert": {
+                "artist_name": album.artist_name,
+                "album_name": album.album_name,
+                "cover_url": album.cover_url,
+                "cover_url_reserve": album.cover_url_reserve,
+                "source": SOURCE_SEARCH,
+                "expires_at": _expires_at(),
+            }},
+            upsert=True,
+        ))
+    if not operations:
+        return
+    try:
+        collection = await get_album_info_collection()
+        await collection.bulk_write(operations, ordered=False)
+    except Exception as exc:
+        logger.warning(f"Не удалось записать альбомы из поиска в кэш Mongo: {exc}")
+
+
+async def invalidate_album_info(artist_name: str, album_name: str) -> bool:
+    key = album_info_key(artist_name, album_name)
+    ALBUM_INFO_L1.delete(key)
+    collection = await get_album_info_collection()
+    result = await collection.delete_one({"_id": key})
+    return bool(result.deleted_count)
+
+
+if __name__ == "__main__":
+
+    async def main(artist_name: str, album_name: str) -> None:
+        await init_database()
+        try:
+            deleted = await invalidate_album_info(artist_name, album_name)
+            print(f"[ok] {artist_name} — {album_name}: {'удалён' if deleted else 'не было в кэше'}")
+        finally:
+            await close_database()
+
+    if len(sys.argv) != 3:
+        print('Использование: python -m src.album_info_cache "<artist>" "<album>"')
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1], sys.argv[2]))
@@ -2,11 +2,8 @@
 
 from __future__ import annotations
 
-import mimetypes
-from pathlib import Path
-
 from src.config import cfg
-from src.cdn.s3_async import s3_client
+from src.static_assets import THEME_CSS, asset_url, rewrite_asset_urls, source_asset
 
 
 def data_asset_public_url(relative_under_data: str) -> str:
@@ -21,23 +18,6 @@ def s3_key_for_data_file(relative_under_data: str) -> str:
     return rel
 
 
-async def upload_data_file(local_file: Path, relative_under_data: str) -> str:
-    key = s3_key_for_data_file(relative_under_data)
-    content_type, _ = mimetypes.guess_type(local_file.name)
-    if not content_type:
-        content_type = "application/octet-stream"
-    body = local_file.read_bytes()
-    async with s3_client() as client:
-        await client.put_object(
-            Bucket=cfg.s3_bucket,
-            Key=key,
-            Body=body,
-            ContentType=content_type,
-            ACL="public-read",
-        )
-    return data_asset_public_url(relative_under_data)
-
-
 def build_vv_theme_css() -> str:
     bg = data_asset_public_url("backgrounds/back1.jpg")
     loading = data_asset_public_url("other/loading.jpg")
@@ -51,10 +31,15 @@ def build_vv_theme_css() -> str:
 def html_inject_cdn_head() -> str:
     unfound = data_asset_public_url("other/unfound.jpg")
     base = cfg.s3_base_domain.rstrip("/")
+    if cfg.THEME_CSS_INLINE:
+        # Несколько сотен байт: дешевле встроить, чем блокировать отрисовку отдельным запросом
+        theme = f"<style>{source_asset(THEME_CSS).body.decode('utf-8')}</style>\n"
+    else:
+        theme = f'<link href="{asset_url(THEME_CSS)}" rel="stylesheet">\n'
     return (
         f"<script>window.__VV_UNFOUND_IMG__={unfound!r};"
         f"window.__VV_DATA_CDN_BASE__={base!r};</script>\n"
-        '<link href="/static/vv-data-theme.css" rel="stylesheet">\n'
+        + theme
     )
 
 
@@ -70,10 +55,11 @@ def patch_html_with_cdn_assets(html: str) -> str:
     ]
     for old, new in pairs:
         html = html.replace(old, new)
+    # Вставка ищет исходную ссылку на styles.css, поэтому адреса с хэшем подставляются после неё
     needle = '<link href="/static/styles.css"'
     inject = html_inject_cdn_head()
     if needle in html:
-        return html.replace(needle, inject + needle, 1)
-    if "</head>" in html:
-        return html.replace("</head>", inject + "</head>", 1)
-    return html
+        html = html.replace(needle, inject + needle, 1)
+    elif "</head>" in html:
+        html = html.replace("</head>", inject + "</head>", 1)
+    return rewrite_asset_urls(html)
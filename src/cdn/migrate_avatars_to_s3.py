@@ -1,24 +1,32 @@
 """Дефолтный аватар (other/), локальные user_avatars → avatars/, правка legacy URL в MongoDB.
 
-Запуск: python -m src.migrate_avatars_to_s3
+Файлы заливаются параллельно через migration_runner (неизменённые пропускаются, обрыв можно докачать
+повторным запуском), URL в Mongo обновляются пачками bulk_write.
+
+Запуск: python -m src.cdn.migrate_avatars_to_s3 [--force]
 """
 
 from __future__ import annotations
 
 import asyncio
 import re
+import sys
 from pathlib import Path
 
 from src.config import cfg
-from src.database import close_database, init_database, get_users_collection
+from src.database import close_database, init_database
+from src.users_repository import UsersRepository, get_users_repository
+from src.cdn.migration_runner import UploadJob, gather_bounded, run_uploads
+from src.cdn.s3_async import shared_s3_client
 from src.cdn.s3_avatars import (
     AVATAR_EXT_TO_CONTENT_TYPE,
     DEFAULT_AVATAR_KEY,
     LEGACY_STATIC_DEFAULT_AVATARS,
+    USER_AVATAR_PREFIX,
     default_avatar_public_url,
+    delete_stale_user_avatars,
     normalize_stored_avatar_url,
-    upload_public_bytes,
-    upload_user_avatar_to_s3,
+    public_url_for_key,
 )
 
 USER_AVATARS_DIR: Path = cfg.WEBSITE_DIR / "data" / "user_avatars"
@@ -35,40 +43,52 @@ def _default_avatar_local_path() -> Path | None:
     return None
 
 
-async def _migrate_default() -> None:
+def _user_avatar_job(user_id: str, path: Path) -> UploadJob | None:
+    ext = path.suffix.lower()
+    content_type = AVATAR_EXT_TO_CONTENT_TYPE.get(ext)
+    if not content_type:
+        return None
+    return UploadJob(f"{USER_AVATAR_PREFIX}/{user_id}{ext}", path, content_type)
+
+
+async def _upload_user_avatars(users: UsersRepository, owners: dict[UploadJob, str], force: bool, label: str) -> None:
+    """Заливает аватары, у залитых заново убирает прежние варианты, URL в Mongo — одной пачкой."""
+    stats = await run_uploads(list(owners), force=force, label=label)
+    await gather_bounded(delete_stale_user_avatars(owners[job], keep_key=job.key) for job in stats.uploaded)
+    modified = await users.set_avatar_urls({owners[job]: public_url_for_key(job.key) for job in stats.done})
+    print(f"[ok] {label}: avatar_url обновлён у {modified} пользователей")
+
+
+async def _migrate_default(force: bool) -> None:
     path = _default_avatar_local_path()
     if not path:
         print("[skip] нет default_avatar.jpg в data/other/ или data/avatars/")
         return
-    url = await upload_public_bytes(
-        DEFAULT_AVATAR_KEY,
-        path.read_bytes(),
-        "image/jpeg",
-    )
-    print(f"[ok] дефолтный аватар в S3 ({path.relative_to(cfg.WEBSITE_DIR)}): {url}")
+    stats = await run_uploads([UploadJob(DEFAULT_AVATAR_KEY, path, "image/jpeg")], force=force, label="default")
+    if stats.done:
+        print(f"[ok] дефолтный аватар в S3 ({path.relative_to(cfg.WEBSITE_DIR)}): {default_avatar_public_url()}")
 
 
-async def _migrate_local_files(coll) -> None:
+async def _migrate_local_files(users: UsersRepository, force: bool) -> None:
     if not USER_AVATARS_DIR.is_dir():
         print(f"[skip] нет каталога {USER_AVATARS_DIR}")
         return
+    owners: dict[UploadJob, str] = {}
     for path in sorted(USER_AVATARS_DIR.iterdir()):
         if not path.is_file() or path.name.startswith("."):
             continue
-        ext = path.suffix.lower()
-        if ext not in AVATAR_EXT_TO_CONTENT_TYPE:
+        job = _user_avatar_job(path.stem, path)
+        if job is None:
             print(f"[skip] неизвестное расширение: {path.name}")
             continue
-        user_id = path.stem
-        data = path.read_bytes()
-        content_type = AVATAR_EXT_TO_CONTENT_TYPE[ext]
-        url = await upload_user_avatar_to_s3(user_id, data, content_type, ext)
-        result = await coll.update_one({"user_id": user_id}, {"$set": {"avatar_url": url}})
-        print(f"[ok] {path.name} -> {url} (matched={result.matched_count})")
+        owners[job] = path.stem
+    await _upload_user_avatars(users, owners, force, label="user_avatars")
 
 
-async def _migrate_legacy_db_urls(coll) -> None:
-    cursor = coll.find({"avatar_url": {"$regex": r"^/static/data/user_avatars/"}})
+async def _migrate_legacy_db_urls(users: UsersRepository, force: bool) -> None:
+    owners: dict[UploadJob, str] = {}
+    fallback: dict[str, str] = {}
+    cursor = users.iter_avatar_urls(r"^/static/data/user_avatars/")
     async for doc in cursor:
         owner_id = doc.get("user_id")
         raw = (doc.get("avatar_url") or "").strip()
@@ -78,59 +98,57 @@ async def _migrate_legacy_db_urls(coll) -> None:
         fname = m.group(1)
         local = USER_AVATARS_DIR / fname
         if not local.is_file():
-            new_url = default_avatar_public_url()
-            await coll.update_one({"user_id": owner_id}, {"$set": {"avatar_url": new_url}})
+            fallback[owner_id] = default_avatar_public_url()
             print(f"[warn] {owner_id}: файла нет ({fname}), в БД -> дефолт CDN")
             continue
-        ext = local.suffix.lower()
-        content_type = AVATAR_EXT_TO_CONTENT_TYPE.get(ext)
-        if not content_type:
-            new_url = default_avatar_public_url()
-            await coll.update_one({"user_id": owner_id}, {"$set": {"avatar_url": new_url}})
+        job = _user_avatar_job(owner_id, local)
+        if job is None:
+            fallback[owner_id] = default_avatar_public_url()
             print(f"[warn] {owner_id}: плохое расширение {fname}, в БД -> дефолт CDN")
             continue
-        data = local.read_bytes()
-        url = await upload_user_avatar_to_s3(owner_id, data, content_type, ext)
-        await coll.update_one({"user_id": owner_id}, {"$set": {"avatar_url": url}})
-        print(f"[ok] legacy /static/... пользователя {owner_id} -> {url}")
+        owners[job] = owner_id
+    if fallback:
+        await users.set_avatar_urls(fallback)
+    await _upload_user_avatars(users, owners, force, label="legacy /static/")
 
 
-async def _normalize_static_defaults_in_db(coll) -> None:
+async def _normalize_static_defaults_in_db(users: UsersRepository) -> None:
     for legacy in LEGACY_STATIC_DEFAULT_AVATARS:
-        result = await coll.update_many(
-            {"avatar_url": legacy},
-            {"$set": {"avatar_url": default_avatar_public_url()}},
-        )
-        if result.modified_count:
-            print(f"[ok] заменён {legacy!r} в БД: {result.modified_count} док.")
+        modified = await users.replace_avatar_url(legacy, default_avatar_public_url())
+        if modified:
+            print(f"[ok] заменён {legacy!r} в БД: {modified} док.")
 
 
-async def _rewrite_cdn_avatar_urls_in_db(coll) -> None:
+async def _rewrite_cdn_avatar_urls_in_db(users: UsersRepository) -> None:
     """Переписать в Mongo старые https URL: /data/, user_avatars/, avatars/default_avatar.jpg."""
-    cursor = coll.find({"avatar_url": {"$regex": "^https?://"}})
+    updates: dict[str, str] = {}
+    cursor = users.iter_avatar_urls("^https?://")
     async for doc in cursor:
         raw = (doc.get("avatar_url") or "").strip()
         if not raw:
             continue
         final = normalize_stored_avatar_url(raw)
         if final != raw:
-            await coll.update_one({"user_id": doc["user_id"]}, {"$set": {"avatar_url": final}})
-            print(f"[ok] CDN URL пользователя {doc.get('user_id')}: обновлён")
+            updates[doc["user_id"]] = final
+    if updates:
+        modified = await users.set_avatar_urls(updates)
+        print(f"[ok] CDN URL обновлены: {modified} пользователей")
 
 
-async def main() -> None:
+async def main(force: bool = False) -> None:
     await init_database()
     try:
-        coll = await get_users_collection()
-        await _migrate_default()
-        await _migrate_local_files(coll)
-        await _migrate_legacy_db_urls(coll)
-        await _normalize_static_defaults_in_db(coll)
-        await _rewrite_cdn_avatar_urls_in_db(coll)
+        users = await get_users_repository()
+        async with shared_s3_client():
+            await _migrate_default(force)
+            await _migrate_local_files(users, force)
+            await _migrate_legacy_db_urls(users, force)
+        await _normalize_static_defaults_in_db(users)
+        await _rewrite_cdn_avatar_urls_in_db(users)
         print("Готово.")
     finally:
         await close_database()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(force="--force" in sys.argv[1:]))
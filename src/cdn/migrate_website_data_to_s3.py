@@ -3,16 +3,21 @@
 Не заливается: users/, user_avatars/ (HTML и пользовательские аватары — отдельно).
 Не заливается файл avatars/default_avatar.jpg с диска — канонический дефолт в other/default_avatar.jpg.
 
-Запуск: python -m src.cdn.migrate_website_data_to_s3
+Запуск: python -m src.cdn.migrate_website_data_to_s3 [--force]
+Повторный запуск заливает только изменённые и недостающие файлы; --force — всё заново.
 """
 
 from __future__ import annotations
 
 import asyncio
+import mimetypes
+import sys
 from pathlib import Path
 
 from src.config import cfg
-from src.cdn.data_cdn import upload_data_file
+from src.cdn.data_cdn import s3_key_for_data_file
+from src.cdn.migration_runner import UploadJob, run_uploads
+from src.cdn.s3_async import shared_s3_client
 
 DATA_ROOT: Path = cfg.WEBSITE_DIR / "data"
 ONLY_TOP = frozenset({"avatars", "backgrounds", "other"})
@@ -21,11 +26,8 @@ SKIP_TOP_LEVEL_DIRS = frozenset({"users", "user_avatars"})
 _SKIP_DISK_DEFAULT_IN_AVATARS = "avatars/default_avatar.jpg"
 
 
-async def main() -> None:
-    if not DATA_ROOT.is_dir():
-        print(f"Нет каталога {DATA_ROOT}")
-        return
-
+def collect_jobs() -> list[UploadJob]:
+    jobs: list[UploadJob] = []
     for path in sorted(DATA_ROOT.rglob("*")):
         if not path.is_file():
             continue
@@ -38,11 +40,21 @@ async def main() -> None:
         if rel_posix == _SKIP_DISK_DEFAULT_IN_AVATARS:
             print(f"[skip] дефолт только из other/default_avatar.jpg: {rel_posix}")
             continue
-        url = await upload_data_file(path, rel_posix)
-        print(f"[ok] {rel_posix} -> {url}")
+        content_type, _ = mimetypes.guess_type(path.name)
+        jobs.append(UploadJob(s3_key_for_data_file(rel_posix), path, content_type or "application/octet-stream"))
+    return jobs
+
+
+async def main(force: bool = False) -> None:
+    if not DATA_ROOT.is_dir():
+        print(f"Нет каталога {DATA_ROOT}")
+        return
+
+    async with shared_s3_client():
+        await run_uploads(collect_jobs(), force=force, label="data")
 
     print("Готово (avatars, backgrounds, other → S3).")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(force="--force" in sys.argv[1:]))
@@ -0,0 +1,140 @@
+"""Параллельная возобновляемая заливка файлов в S3 для скриптов миграции CDN.
+
+Перед заливкой бакет листается по нужным префиксам: файл, чей MD5 совпадает с ETag объекта,
+пропускается. Поэтому повторный запуск после обрыва докачивает только недостающее.
+MD5 локальных файлов кэшируются в манифесте (по размеру и mtime), чтобы не читать их заново.
+Файлы передаются в put_object открытыми, без read_bytes(); одновременно идёт не больше
+CDN_UPLOAD_CONCURRENCY заливок через общий клиент S3.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections.abc import Awaitable, Iterable
+from pathlib import Path
+from typing import Any, NamedTuple, Optional, TypeVar
+
+import orjson
+from botocore.exceptions import BotoCoreError, ClientError
+
+from src.config import cfg
+from src.cdn.s3_async import s3_client
+
+T = TypeVar("T")
+
+MANIFEST_PATH: Path = cfg.BASE_DIR / "__cdn_manifest.json"
+_HASH_CHUNK = 1024 * 1024
+
+
+class UploadJob(NamedTuple):
+    key: str
+    path: Path
+    content_type: str
+
+
+class UploadStats(NamedTuple):
+    uploaded: list[UploadJob]
+    skipped: list[UploadJob]
+    failed: list[UploadJob]
+
+    @property
+    def done(self) -> list[UploadJob]:
+        """Объекты, которые теперь лежат в бакете: залитые и совпавшие."""
+        return self.uploaded + self.skipped
+
+
+class UploadManifest:
+    """Кэш MD5 локальных файлов: путь → [размер, mtime_ns, md5]."""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        try:
+            self._entries: dict[str, list] = orjson.loads(path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            self._entries = {}
+
+    def md5(self, file: Path) -> str:
+        stat = file.stat()
+        entry = self._entries.get(str(file))
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.md5(usedforsecurity=False)
+        with file.open("rb") as f:
+            while chunk := f.read(_HASH_CHUNK):
+                digest.update(chunk)
+        self._entries[str(file)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def save(self) -> None:
+        self.path.write_bytes(orjson.dumps(self._entries))
+
+
+async def gather_bounded(coros: Iterable[Awaitable[T]], limit: Optional[int] = None) -> list[T]:
+    """asyncio.gather, но одновременно выполняется не больше limit корутин."""
+    semaphore = asyncio.Semaphore(limit or cfg.CDN_UPLOAD_CONCURRENCY)
+
+    async def run(coro: Awaitable[T]) -> T:
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+
+async def remote_etags(client: Any, prefixes: Iterable[str]) -> dict[str, str]:
+    """key → ETag без кавычек для всех объектов под префиксами."""
+    etags: dict[str, str] = {}
+    paginator = client.get_paginator("list_objects_v2")
+    for prefix in sorted(set(prefixes)):
+        async for page in paginator.paginate(Bucket=cfg.s3_bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                etags[obj["Key"]] = obj["ETag"].strip('"')
+    return etags
+
+
+async def run_uploads(jobs: list[UploadJob], *, force: bool = False, label: str = "S3") -> UploadStats:
+    """Заливает jobs параллельно; force — не сравнивать с бакетом и залить всё заново."""
+    stats = UploadStats([], [], [])
+    if not jobs:
+        return stats
+    started = time.monotonic()
+    manifest = UploadManifest()
+    async with s3_client() as client:
+        etags = {} if force else await remote_etags(client, {job.key.split("/", 1)[0] + "/" for job in jobs})
+        total = len(jobs)
+        processed = 0
+
+        async def upload(job: UploadJob) -> None:
+            nonlocal processed
+            md5 = await asyncio.to_thread(manifest.md5, job.path)
+            if etags.get(job.key) == md5:
+                stats.skipped.append(job)
+            else:
+                try:
+                    with job.path.open("rb") as body:
+                        await client.put_object(
+                            Bucket=cfg.s3_bucket,
+                            Key=job.key,
+                            Body=body,
+                            ContentType=job.content_type,
+                            ACL="public-read",
+                        )
+                except (ClientError, BotoCoreError, OSError) as e:
+                    stats.failed.append(job)
+                    print(f"[fail] {job.key}: {e}")
+                else:
+                    stats.uploaded.append(job)
+            processed += 1
+            if processed % 50 == 0 or processed == total:
+                print(f"[{label}] {processed}/{total}: залито {len(stats.uploaded)}, без изменений {len(stats.skipped)}, "
+                      f"ошибок {len(stats.failed)}")
+
+        try:
+            await gather_bounded(upload(job) for job in jobs)
+        finally:
+            manifest.save()
+
+    print(f"[{label}] за {time.monotonic() - started:.1f} с: залито {len(stats.uploaded)}, "
+          f"без изменений {len(stats.skipped)}, ошибок {len(stats.failed)}")
+    return stats
@@ -1,20 +1,26 @@
 """Полная перезаливка CDN: avatars + backgrounds + other, затем дефолт/пользовательские аватары и правка MongoDB.
 
-    python -m src.reupload_all_cdn
+    python -m src.cdn.reupload_all_cdn [--force]
+
+Неизменённые файлы пропускаются (MD5 против ETag в бакете); --force — залить всё заново.
 """
 
 from __future__ import annotations
 
 import asyncio
+import sys
 
 from src.cdn.migrate_avatars_to_s3 import main as migrate_avatars_main
 from src.cdn.migrate_website_data_to_s3 import main as migrate_data_main
+from src.cdn.s3_async import shared_s3_client
 
 
-async def main() -> None:
-    await migrate_data_main()
-    await migrate_avatars_main()
+async def main(force: bool = False) -> None:
+    # Один клиент S3 на оба шага: вложенные скрипты увидят его открытым и не станут закрывать
+    async with shared_s3_client():
+        await migrate_data_main(force)
+        await migrate_avatars_main(force)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(force="--force" in sys.argv[1:]))
@@ -1,23 +1,85 @@
-"""Async S3-клиент (aioboto3) для Selectel и совместимых эндпоинтов."""
+"""Async S3-клиент (aioboto3) для Selectel и совместимых эндпоинтов.
+
+Один клиент на процесс: сессия, учётные данные и пул TLS-соединений создаются один раз.
+Приложение открывает его в lifespan, скрипты — через shared_s3_client() на весь прогон.
+"""
 
 from __future__ import annotations
 
 from collections.abc import AsyncIterator
-from contextlib import asynccontextmanager
-from typing import Any
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Optional
 
 import aioboto3
+from aiobotocore.config import AioConfig
 
 from src.config import cfg
+from src.utils.logger import logger
 
+# Глобальный клиент: создаётся в lifespan приложения (или скриптом), закрывается при остановке
+S3_CLIENT: Optional[Any] = None
+_S3_EXIT_STACK: Optional[AsyncExitStack] = None
 
-@asynccontextmanager
-async def s3_client() -> AsyncIterator[Any]:
-    session = aioboto3.Session()
-    async with session.client(
+
+def build_s3_config() -> AioConfig:
+    return AioConfig(
+        max_pool_connections=cfg.S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=cfg.S3_CONNECT_TIMEOUT_SEC,
+        read_timeout=cfg.S3_READ_TIMEOUT_SEC,
+        retries={"total_max_attempts": cfg.S3_MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+    )
+
+
+def _open_client(session: aioboto3.Session):
+    return session.client(
         "s3",
         endpoint_url=cfg.s3_endpoint,
         aws_access_key_id=cfg.s3_access_key,
         aws_secret_access_key=cfg.s3_secret_key,
-    ) as client:
+        config=build_s3_config(),
+    )
+
+
+async def init_s3_client() -> None:
+    """Открывает общий клиент S3 (вызывается из lifespan)."""
+    global S3_CLIENT, _S3_EXIT_STACK
+    if S3_CLIENT is not None:
+        return
+    stack = AsyncExitStack()
+    S3_CLIENT = await stack.enter_async_context(_open_client(aioboto3.Session()))
+    _S3_EXIT_STACK = stack
+    logger.info("S3-клиент инициализирован")
+
+
+async def close_s3_client() -> None:
+    """Закрывает пул соединений S3."""
+    global S3_CLIENT, _S3_EXIT_STACK
+    if _S3_EXIT_STACK is not None:
+        await _S3_EXIT_STACK.aclose()
+        S3_CLIENT = None
+        _S3_EXIT_STACK = None
+        logger.info("S3-клиент закрыт")
+
+
+@asynccontextmanager
+async def shared_s3_client() -> AsyncIterator[Any]:
+    """Для скриптов: общий клиент на весь прогон; если он уже открыт (вложенный скрипт), не закрываем его."""
+    opened = S3_CLIENT is None
+    if opened:
+        await init_s3_client()
+    try:
+        yield S3_CLIENT
+    finally:
+        if opened:
+            await close_s3_client()
+
+
+@asynccontextmanager
+async def s3_client() -> AsyncIterator[Any]:
+    """Общий клиент, если он открыт; иначе временный на один вызов (разовые вызовы вне приложения)."""
+    if S3_CLIENT is not None:
+        yield S3_CLIENT
+        return
+    async with _open_client(aioboto3.Session()) as client:
         yield client
@@ -1,7 +1,9 @@
-"""Аватары в Selectel S3: дефолт в other/, загрузки пользователей в avatars/{user_id}.ext."""
+"""Аватары в Selectel S3: дефолт в other/, загрузки пользователей в avatars/{user_id}_{версия}_{size}.webp."""
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import re
 from typing import Any
 
@@ -9,11 +11,22 @@ from botocore.exceptions import ClientError
 
 from src.config import cfg
 from src.cdn.s3_async import s3_client
+from src.utils.logger import logger
 
 # Ключи в бакете (корень CDN = s3_base_domain)
 DEFAULT_AVATAR_KEY = "other/default_avatar.jpg"
 USER_AVATAR_PREFIX = "avatars"
 _USER_AVATAR_EXTS = (".jpg", ".png", ".webp", ".gif")
+# Обработанный аватар: avatars/{user_id}_{версия}_{size}.webp, версия — хэш содержимого.
+# Новая загрузка даёт новые URL, поэтому CDN и браузеры могут кэшировать аватар бессрочно.
+# В БД хранится URL размера страницы профиля; у первых загрузок версии в ключе нет
+AVATAR_VARIANT_SIZES = (64, 150, 300)
+AVATAR_DISPLAY_SIZE = 150
+_AVATAR_VERSION_HEX = 12
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_AVATAR_VARIANT_URL = re.compile(
+    rf"^(.+/{USER_AVATAR_PREFIX}/[^/]+?(?:_[0-9a-f]{{{_AVATAR_VERSION_HEX}}})?)_{AVATAR_DISPLAY_SIZE}\.webp$"
+)
 
 AVATAR_EXT_TO_CONTENT_TYPE: dict[str, str] = {
     ".jpg": "image/jpeg",
@@ -76,13 +89,55 @@ def coalesce_avatar_url(stored: str | None) -> str:
     return s
 
 
-async def _delete_user_avatar_variants(client: Any, user_id: str) -> None:
-    for ext in _USER_AVATAR_EXTS:
-        key = f"{USER_AVATAR_PREFIX}/{user_id}{ext}"
-        try:
-            await client.delete_object(Bucket=cfg.s3_bucket, Key=key)
-        except ClientError:
-            pass
+def avatar_version(variants: dict[int, bytes]) -> str:
+    digest = hashlib.blake2b(digest_size=_AVATAR_VERSION_HEX // 2)
+    for size in sorted(variants):
+        digest.update(variants[size])
+    return digest.hexdigest()
+
+
+def avatar_variant_key(user_id: str, version: str, size: int) -> str:
+    return f"{USER_AVATAR_PREFIX}/{user_id}_{version}_{size}.webp"
+
+
+def avatar_srcset(avatar_url: str) -> str:
+    """srcset для URL обработанного аватара ("" — исходный файл без вариантов)."""
+    m = _AVATAR_VARIANT_URL.match(avatar_url)
+    if not m:
+        return ""
+    return ", ".join(f"{m.group(1)}_{size}.webp {size}w" for size in AVATAR_VARIANT_SIZES)
+
+
+def _user_avatar_key_re(user_id: str) -> re.Pattern[str]:
+    """Все виды ключей аватара пользователя: {user_id}.ext, {user_id}_{size}.webp, {user_id}_{версия}_{size}.webp."""
+    exts = "|".join(re.escape(ext) for ext in _USER_AVATAR_EXTS)
+    return re.compile(
+        rf"^{USER_AVATAR_PREFIX}/{re.escape(user_id)}(?:{exts}|(?:_[0-9a-f]{{{_AVATAR_VERSION_HEX}}})?_\d+\.webp)$"
+    )
+
+
+async def _list_user_avatar_keys(client: Any, user_id: str) -> list[str]:
+    """Ключи версий меняются с каждой загрузкой, поэтому прежние ищем листингом по префиксу пользователя."""
+    key_re = _user_avatar_key_re(user_id)
+    keys: list[str] = []
+    paginator = client.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(Bucket=cfg.s3_bucket, Prefix=f"{USER_AVATAR_PREFIX}/{user_id}"):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []) if key_re.match(obj["Key"]))
+    return keys
+
+
+async def _delete_user_avatar_variants(client: Any, user_id: str, keep_keys: frozenset[str] = frozenset()) -> None:
+    """Все объекты аватара, кроме keep_keys, одним запросом DeleteObjects."""
+    try:
+        objects = [{"Key": key} for key in await _list_user_avatar_keys(client, user_id) if key not in keep_keys]
+        if not objects:
+            return
+        response = await client.delete_objects(Bucket=cfg.s3_bucket, Delete={"Objects": objects, "Quiet": True})
+    except ClientError as e:
+        logger.warning(f"Не удалось удалить старые аватары {user_id}: {e}")
+        return
+    for error in response.get("Errors", []):
+        logger.warning(f"Не удалось удалить {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
 
 
 async def delete_user_avatar(user_id: str) -> None:
@@ -91,28 +146,28 @@ async def delete_user_avatar(user_id: str) -> None:
         await _delete_user_avatar_variants(client, user_id)
 
 
-async def upload_user_avatar_to_s3(user_id: str, file_bytes: bytes, content_type: str, ext: str) -> str:
-    """Удаляет прежние объекты аватара пользователя, загружает новый, возвращает публичный URL."""
-    key = f"{USER_AVATAR_PREFIX}/{user_id}{ext}"
+async def delete_stale_user_avatars(user_id: str, keep_key: str) -> None:
+    """Прежние объекты аватара, кроме keep_key (файл залит скриптом миграции через migration_runner)."""
     async with s3_client() as client:
-        await _delete_user_avatar_variants(client, user_id)
-        await client.put_object(
-            Bucket=cfg.s3_bucket,
-            Key=key,
-            Body=file_bytes,
-            ContentType=content_type,
-            ACL="public-read",
-        )
-    return public_url_for_key(key)
+        await _delete_user_avatar_variants(client, user_id, keep_keys=frozenset({keep_key}))
 
 
-async def upload_public_bytes(key: str, file_bytes: bytes, content_type: str) -> str:
+async def upload_user_avatar_variants(user_id: str, variants: dict[int, bytes]) -> str:
+    """Загружает WebP всех размеров параллельно, затем удаляет прежнюю версию; возвращает URL размера страницы."""
+    version = avatar_version(variants)
+    keys = {size: avatar_variant_key(user_id, version, size) for size in variants}
     async with s3_client() as client:
-        await client.put_object(
-            Bucket=cfg.s3_bucket,
-            Key=key,
-            Body=file_bytes,
-            ContentType=content_type,
-            ACL="public-read",
-        )
-    return public_url_for_key(key)
+        await asyncio.gather(*(
+            client.put_object(
+                Bucket=cfg.s3_bucket,
+                Key=keys[size],
+                Body=body,
+                ContentType="image/webp",
+                CacheControl=AVATAR_CACHE_CONTROL,
+                ACL="public-read",
+            )
+            for size, body in variants.items()
+        ))
+        await _delete_user_avatar_variants(client, user_id, keep_keys=frozenset(keys.values()))
+    return public_url_for_key(keys[AVATAR_DISPLAY_SIZE])
+
@@ -26,6 +26,15 @@ class Config(BaseSettings):
     MONGO_URI: str = "mongodb://localhost:27017"
     # Срок сессии: TTL в Mongo по login_time и Max-Age cookie.
     SESSION_TTL_SEC: int = 14 * 24 * 60 * 60
+    # Кэш сессий в памяти процесса: столько секунд запрос не ходит в Mongo за той же кукой
+    SESSION_CACHE_TTL_SEC: int = 60
+    # bcrypt: стоимость хэша и отдельный пул потоков, чтобы вход не блокировал event loop
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_POOL_SIZE: int = 2
+    # Сколько проверок может ждать свободный поток; сверх этого вход сразу получает отказ
+    PASSWORD_QUEUE_MAX: int = 32
+    # Потоки для декодирования и сжатия аватаров (Pillow)
+    AVATAR_POOL_SIZE: int = 2
 
     APP_HOST: str = "0.0.0.0"
     APP_PORT: int = 8000
@@ -34,8 +43,36 @@ class Config(BaseSettings):
     COOKIE_SECURE: bool = False
     FORWARDED_ALLOW_IPS: str = "127.0.0.1"
     ENABLE_DOCS: bool = False
+    # Разработка: пересобирать HTML-страницу из web/website при изменении файла (на проде — только при старте)
+    TEMPLATES_AUTO_RELOAD: bool = False
+    # Встраивать vv-data-theme.css (переменные с адресами CDN) в <head> вместо отдельного запроса
+    THEME_CSS_INLINE: bool = False
 
     SEARCH_CACHE_TTL_SEC: int = 300
+    # Stale-while-revalidate: до этого срока устаревший ответ отдаётся сразу и обновляется в фоне (0 — выключено)
+    SEARCH_CACHE_STALE_TTL_SEC: int = 3600
+    SEARCH_CACHE_MAX_SIZE: int = 500
+    # Второй уровень кэша поиска в Mongo: общий для всех воркеров и переживает рестарт
+    SEARCH_CACHE_MONGO: bool = False
+    # Обложки альбомов (album.getInfo) в Mongo: меняются редко, поэтому срок долгий
+    ALBUM_INFO_CACHE_TTL_SEC: int = 30 * 24 * 60 * 60
+
+    # Пул keep-alive соединений к Last.fm (один клиент на процесс)
+    LASTFM_MAX_CONNECTIONS: int = 20
+    LASTFM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LASTFM_KEEPALIVE_EXPIRY_SEC: float = 30.0
+    LASTFM_TIMEOUT_SEC: float = 5.0
+    LASTFM_CONNECT_TIMEOUT_SEC: float = 3.0
+    # HTTP/2 требует пакет h2 (httpx[http2]); без него остаётся HTTP/1.1
+    LASTFM_HTTP2: bool = False
+
+    # Общий клиент S3 (один на процесс): пул соединений, повторы и таймауты
+    S3_MAX_POOL_CONNECTIONS: int = 20
+    S3_MAX_ATTEMPTS: int = 3
+    S3_CONNECT_TIMEOUT_SEC: float = 5.0
+    S3_READ_TIMEOUT_SEC: float = 30.0
+    # Скрипты миграции CDN: столько файлов заливается одновременно
+    CDN_UPLOAD_CONCURRENCY: int = 16
 
     LOG_LEVEL: str = "INFO"
     LOG_DIR: Path = BASE_DIR / "__logs"
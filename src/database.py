@@ -61,10 +61,16 @@ async def init_database():
             VINYL_VAULT_DB = await get_db(MONGO_CLIENT, 'VinylVault')
             await VINYL_VAULT_DB["users_collection"].create_index("username", unique=True)
             await VINYL_VAULT_DB["users_collection"].create_index("email", unique=True)
+            # Все чтения и записи по альбомам и аватару идут по user_id
+            await VINYL_VAULT_DB["users_collection"].create_index("user_id")
             await VINYL_VAULT_DB["session_cookies_collection"].create_index(
                 "login_time",
                 expireAfterSeconds=cfg.SESSION_TTL_SEC,
             )
+            if cfg.SEARCH_CACHE_MONGO:
+                # Срок задаёт сам документ (expires_at), поэтому смена TTL в настройках не конфликтует с индексом
+                await VINYL_VAULT_DB["search_cache_collection"].create_index("expires_at", expireAfterSeconds=0)
+            await VINYL_VAULT_DB["album_info_collection"].create_index("expires_at", expireAfterSeconds=0)
             logger.info("MongoDB подключение инициализировано")
             return
         except (TimeoutError, Exception) as exc:
@@ -114,31 +120,6 @@ async def add_session(collection: AsyncIOMotorCollection, session_id: str, user:
     )
 
 
-async def is_in_collection(field: str, value: str, collection: AsyncIOMotorCollection) -> bool:
-    return bool(await collection.find_one({field: value}))
-
-
-async def pick_random_username(
-    collection: AsyncIOMotorCollection,
-    exclude_username: str | None = None,
-) -> Optional[str]:
-    """ Случайный username: сначала среди профилей с альбомами, иначе среди любых. """
-    base: dict = {}
-    if exclude_username:
-        base["username"] = {"$ne": exclude_username}
-
-    for match in ({**base, "albums.0": {"$exists": True}}, base):
-        pipeline = [
-            {"$match": match},
-            {"$sample": {"size": 1}},
-            {"$project": {"_id": 0, "username": 1}},
-        ]
-        docs = await collection.aggregate(pipeline).to_list(length=1)
-        if docs and docs[0].get("username"):
-            return docs[0]["username"]
-    return None
-
-
 async def _get_collection(db: AsyncIOMotorDatabase, collection_name: str) -> AsyncIOMotorCollection:
     collection = db[collection_name]
     return collection
@@ -156,6 +137,18 @@ async def get_session_cookies_collection() -> AsyncIOMotorCollection:
     return await _get_collection(VINYL_VAULT_DB, 'session_cookies_collection')
 
 
+async def get_search_cache_collection() -> AsyncIOMotorCollection:
+    if VINYL_VAULT_DB is None:
+        raise RuntimeError("База данных не инициализирована. Вызовите init_database() сначала.")
+    return await _get_collection(VINYL_VAULT_DB, 'search_cache_collection')
+
+
+async def get_album_info_collection() -> AsyncIOMotorCollection:
+    if VINYL_VAULT_DB is None:
+        raise RuntimeError("База данных не инициализирована. Вызовите init_database() сначала.")
+    return await _get_collection(VINYL_VAULT_DB, 'album_info_collection')
+
+
 if __name__ == "__main__":
 
     async def test():
@@ -0,0 +1,73 @@
+"""Статические HTML-страницы web/website, собранные один раз при старте.
+
+Каждая страница хранится уже с подставленными адресами CDN: байты, ETag и сжатые варианты (gzip,
+brotli — если установлен пакет brotli). Запрос отдаёт готовые байты без чтения диска.
+TEMPLATES_AUTO_RELOAD=true (разработка): страница пересобирается, когда меняется mtime файла.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request, Response
+
+from src.cdn.data_cdn import patch_html_with_cdn_assets
+from src.config import cfg
+from src.utils.http_cache import brotli, compressed_variants, etag_matches, make_etag, not_modified, pick_encoding
+from src.utils.logger import logger
+
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+PAGE_CACHE_HEADERS = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+class CompiledPage:
+    __slots__ = ("path", "mtime_ns", "variants")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime_ns = path.stat().st_mtime_ns
+        html = patch_html_with_cdn_assets(path.read_text(encoding="utf-8"))
+        body = html.encode("utf-8")
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        # encoding → (ETag, байты); у каждого варианта свой ETag, как у nginx
+        self.variants: dict[str, tuple[str, bytes]] = {
+            encoding: (make_etag(digest) if encoding == "identity" else make_etag(digest, encoding), data)
+            for encoding, data in compressed_variants(body).items()
+        }
+
+
+PAGES: dict[str, CompiledPage] = {}
+
+
+def load_pages(directory: Optional[Path] = None) -> None:
+    """Собирает все *.html каталога (вызывается при старте приложения)."""
+    directory = directory or cfg.WEBSITE_DIR
+    for path in sorted(directory.glob("*.html")):
+        PAGES[path.name] = CompiledPage(path)
+    logger.info(f"HTML-страницы собраны: {len(PAGES)} (brotli: {'да' if brotli else 'нет'})")
+
+
+def get_page(name: str) -> CompiledPage:
+    page = PAGES.get(name)
+    if page is None:
+        page = PAGES[name] = CompiledPage(cfg.WEBSITE_DIR / name)
+    elif cfg.TEMPLATES_AUTO_RELOAD and page.path.stat().st_mtime_ns != page.mtime_ns:
+        page = PAGES[name] = CompiledPage(page.path)
+    return page
+
+
+def page_response(request: Request, name: str) -> Response:
+    """Готовая страница: 304 по If-None-Match, иначе лучший вариант из Accept-Encoding."""
+    page = get_page(name)
+    encoding = pick_encoding(request, page.variants)
+    etag, body = page.variants[encoding]
+
+    if any(etag_matches(request, variant_etag) for variant_etag, _ in page.variants.values()):
+        return not_modified(etag, PAGE_CACHE_HEADERS)
+
+    headers = {**PAGE_CACHE_HEADERS, "ETag": etag}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=HTML_MEDIA_TYPE, headers=headers)
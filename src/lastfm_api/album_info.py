@@ -2,7 +2,7 @@ import asyncio
 from pprint import pprint
 
 from src.config import cfg
-from src.utils.utils import send_request_async
+from src.utils.utils import send_request_async, raise_if_unavailable
 
 
 async def album_getinfo(artist_name: str, album_name: str, api_key: str = cfg.API_KEY) -> dict:
@@ -21,7 +21,7 @@ async def album_getinfo(artist_name: str, album_name: str, api_key: str = cfg.AP
 
 
 async def album_search(album_name: str, api_key: str = cfg.API_KEY, limit: int = 5) -> list[dict]:
-    """Get albums list by album_name."""
+    """Get albums list by album_name. Raises LastFmUnavailableError on transient failures."""
     params = {
         "method": "album.search",
         "album": album_name,
@@ -29,7 +29,7 @@ async def album_search(album_name: str, api_key: str = cfg.API_KEY, limit: int =
         "limit": limit,
         "format": "json",
     }
-    data = await send_request_async(params)
+    data = raise_if_unavailable(await send_request_async(params))
     return data.get("results", {}).get("albummatches", {}).get("album", [])
 
 
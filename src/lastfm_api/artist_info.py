@@ -2,7 +2,7 @@ import asyncio
 from pprint import pprint
 
 from src.config import cfg
-from src.utils.utils import send_request_async
+from src.utils.utils import send_request_async, raise_if_unavailable
 
 
 async def artist_info(artist_name: str, api_key: str = cfg.API_KEY) -> dict:
@@ -19,6 +19,7 @@ async def artist_info(artist_name: str, api_key: str = cfg.API_KEY) -> dict:
 
 
 async def artist_top_albums(artist_name: str, api_key: str = cfg.API_KEY, limit: int = 5) -> list[dict]:
+    """Top albums of the artist. Raises LastFmUnavailableError on transient failures."""
     params = {
         "method": "artist.getTopAlbums",
         "artist": artist_name,
@@ -26,7 +27,7 @@ async def artist_top_albums(artist_name: str, api_key: str = cfg.API_KEY, limit:
         "api_key": api_key,
         "format": "json",
     }
-    data = await send_request_async(params)
+    data = raise_if_unavailable(await send_request_async(params))
     return data.get("topalbums", {}).get("album", [])
 
 
@@ -0,0 +1,51 @@
+"""Общий keep-alive HTTP-клиент для Last.fm: соединения переиспользуются между запросами."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import httpx
+
+from src.config import cfg
+from src.utils.logger import logger
+
+# Глобальный клиент: создаётся в lifespan приложения, закрывается при остановке
+LASTFM_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def build_lastfm_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=cfg.LASTFM_MAX_CONNECTIONS,
+        max_keepalive_connections=cfg.LASTFM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=cfg.LASTFM_KEEPALIVE_EXPIRY_SEC,
+    )
+    timeout = httpx.Timeout(cfg.LASTFM_TIMEOUT_SEC, connect=cfg.LASTFM_CONNECT_TIMEOUT_SEC)
+    http2 = cfg.LASTFM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("LASTFM_HTTP2=true, но пакет h2 не установлен (httpx[http2]) — работаем по HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+async def init_lastfm_http_client() -> None:
+    """Создаёт общий клиент Last.fm (вызывается из lifespan)."""
+    global LASTFM_HTTP_CLIENT
+    if LASTFM_HTTP_CLIENT is None:
+        LASTFM_HTTP_CLIENT = build_lastfm_http_client()
+        logger.info("HTTP-клиент Last.fm инициализирован")
+
+
+async def close_lastfm_http_client() -> None:
+    """Закрывает пул соединений Last.fm."""
+    global LASTFM_HTTP_CLIENT
+    if LASTFM_HTTP_CLIENT is not None:
+        await LASTFM_HTTP_CLIENT.aclose()
+        LASTFM_HTTP_CLIENT = None
+        logger.info("HTTP-клиент Last.fm закрыт")
+
+
+def get_lastfm_http_client() -> Optional[httpx.AsyncClient]:
+    return LASTFM_HTTP_CLIENT
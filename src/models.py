@@ -18,9 +18,11 @@ class VV_User(BaseModel):
     user_id: str = Field(default_factory=lambda: str(ObjectId()))
     username: str
     password: str  # bcrypt-хэш
+    # True — bcrypt от SHA-256 пароля; None — старая запись, формат не подтверждён входом
+    password_prehashed: Optional[bool] = None
     email: EmailStr
     albums: list[VV_Album] = Field(default_factory=list)
-    avatar_url: Optional[str] = None  # CDN: other/default_avatar.jpg или avatars/{user_id}.ext
+    avatar_url: Optional[str] = None  # CDN: other/default_avatar.jpg, avatars/{user_id}_{версия}_150.webp или старый avatars/{user_id}.ext
 
 
 class VV_Session(BaseModel):
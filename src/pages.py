@@ -1,25 +1,23 @@
+"""Страница профиля /user/{username}: шаблон разбирается один раз на статические куски и слоты.
+
+Статические куски (вместе с адресами CDN) хранятся байтами; на запрос подставляются только
+username, аватар, флаги владельца/входа и, по желанию, первые карточки альбомов с JSON для script.js.
+"""
+
+import hashlib
+from functools import cache
 from html import escape
+from string import Formatter
+from typing import Any, Iterable, Optional, Sequence
 
-from src.cdn.data_cdn import data_asset_public_url, html_inject_cdn_head
-from src.cdn.s3_avatars import coalesce_avatar_url
+import orjson
 
+from src.cdn.data_cdn import data_asset_public_url, html_inject_cdn_head
+from src.cdn.s3_avatars import AVATAR_DISPLAY_SIZE, avatar_srcset, coalesce_avatar_url
+from src.static_assets import rewrite_asset_urls
 
-def render_user_page(
-    username: str,
-    avatar_url: str | None = None,
-    *,
-    is_owner: bool = False,
-    is_authenticated: bool = False,
-) -> str:
-    avatar_url = escape(coalesce_avatar_url(avatar_url), quote=True)
-    logo_url = escape(data_asset_public_url("other/VVlogo_solo_cr.png"), quote=True)
-    username = escape(username, quote=True)
-    profile_path = f"/user/{username}"
-    profile_path = escape(profile_path, quote=True)
-    owner_flag = "true" if is_owner else "false"
-    auth_flag = "true" if is_authenticated else "false"
-
-    html_content = f"""
+# {cdn_head} и {logo_url} заполняются при разборе шаблона, остальные поля — слоты запроса
+USER_PAGE_TEMPLATE = """
     
     <!DOCTYPE html>
     <html lang="ru">
@@ -33,7 +31,7 @@ def render_user_page(
         <meta name="is-authenticated" content="{auth_flag}">
         <title>VinylVault</title>
         <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        {html_inject_cdn_head()}
+        {cdn_head}
         <link href="/static/styles.css" rel="stylesheet">
         <link href="https://fonts.googleapis.com/css2?family=Barlow:wght@400&display=swap" rel="stylesheet">
     </head>
@@ -49,8 +47,8 @@ def render_user_page(
             </a>
             <div class="navbar-collapse justify-content-end" id="mynavbar">
                 <form class="d-flex">
-                    <a id="my-page-btn" class="btn btn-outline-info me-2" href="/me" style="display: {'inline-block' if is_authenticated else 'none'};">ME</a>
-                    <button id="logout-btn" class="btn btn-outline-danger" type="button" style="display: {'inline-block' if is_authenticated else 'none'};">Log Out</button>
+                    <a id="my-page-btn" class="btn btn-outline-info me-2" href="/me" style="display: {auth_display};">ME</a>
+                    <button id="logout-btn" class="btn btn-outline-danger" type="button" style="display: {auth_display};">Log Out</button>
                 </form>
             </div>
         </div>
@@ -60,7 +58,7 @@ def render_user_page(
     <!-- Блок профиля пользователя -->
     <div class="container-fluid position-relative d-flex justify-content-center" style="background-color: black; height: 100px;">
         <div class="position-absolute d-flex flex-column align-items-center" style="bottom: 0; transform: translateY(50%); z-index: 2;">
-            <img id="user-avatar" src="{avatar_url}" alt="Аватар"
+            <img id="user-avatar" src="{avatar_url}"{avatar_srcset} alt="Аватар"
                  class="rounded-circle"
                  style="width: 150px; height: 150px; object-fit: cover; cursor: default;">
             <input type="file" id="avatar-input" accept="image/jpeg,image/png,image/webp,image/gif" class="d-none">
@@ -76,7 +74,7 @@ def render_user_page(
             <div class="edit-controls">
                 <a id="random-user-btn" class="btn ms-2 btn-outline-info" href="/random-user" style="white-space: nowrap; min-width: 80px;">Random</a>
                 <button id="share-profile-btn" class="btn ms-2 btn-outline-light" type="button" style="white-space: nowrap; min-width: 80px;">Share</button>
-                <button id="edit-btn" class="btn ms-2 btn-outline-secondary" style="white-space: nowrap; min-width: 80px; display: {'inline-block' if is_owner else 'none'};">Edit</button>
+                <button id="edit-btn" class="btn ms-2 btn-outline-secondary" style="white-space: nowrap; min-width: 80px; display: {owner_display};">Edit</button>
                 <div id="save-cancel-controls" style="display: none;">
                     <button id="save-btn" class="btn btn-success" style="white-space: nowrap; min-width: 80px;">Save</button>
                     <button id="cancel-btn" class="btn btn-secondary ms-2" style="white-space: nowrap; min-width: 80px;">Cancel</button>
@@ -87,24 +85,23 @@ def render_user_page(
         <div class="mb-3 position-relative">
             <div class="d-flex align-items-center">
                 <div class="position-relative flex-grow-1">
-                    <input type="text" id="album-search" class="form-control" placeholder="Название альбома" {'' if is_owner else 'disabled'} />
+                    <input type="text" id="album-search" class="form-control" placeholder="Название альбома" {search_disabled} />
                     <div id="lfm_search-dropdown-menu" class="dropdown-menu w-100" style="display: none; position: absolute; top: 100%; left: 0;">
                         <!-- Варианты для поиска появятся здесь -->
                     </div>
                 </div>
-                <button id="search-album-btn" class="btn ms-2 text-bg-danger" style="white-space: nowrap; min-width: 80px; display: {'inline-block' if is_owner else 'none'};">Explore</button>
+                <button id="search-album-btn" class="btn ms-2 text-bg-danger" style="white-space: nowrap; min-width: 80px; display: {owner_display};">Explore</button>
             </div>
         </div>
 
         <div>
             <ul id="album-list" class="row list-unstyled g-3">
-                <!-- Здесь будут храниться альбомы -->
-                <!-- ... -->
-                <!-- Здесь будут храниться альбомы -->
+                <!-- Здесь будут храниться альбомы -->{album_cards}
             </ul>
         </div>
     </div>
     
+    {initial_data}
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
     <script src="/static/script.js"></script>
     
@@ -112,5 +109,111 @@ def render_user_page(
     </html>
 
     
-    """
-    return html_content
+"""
+
+# Разметка повторяет createAlbumCard из script.js; onload/onerror inline — картинка может загрузиться раньше скрипта
+ALBUM_CARD_TEMPLATE = (
+    '<li class="col-6 col-sm-6 col-md-4 col-lg-3" data-album-id="{album_id}" data-album-name="{album_name}"'
+    ' data-artist-name="{artist_name}"><div class="card h-100"><div class="image-container">'
+    '<img src="{cover_url}" class="album_list_square card-img-top" alt="{album_name}"'
+    " onload=\"this.style.opacity='1'\" onerror=\"this.style.display='none'\"></div>"
+    '<div class="card-body"><h5 class="album_list_album card-title">{album_name}</h5>'
+    '<p class="album_list_artist card-text text-muted">{artist_name}</p></div>'
+    '<button class="delete-album-button btn btn-sm position-absolute" style="top: 5px; left: 5px; display: none;">'
+    '❌</button></div></li>'
+)
+
+
+# Слоты, зависящие только от флагов, закодированы заранее
+_OWNER_SLOTS = {
+    True: {"owner_flag": b"true", "owner_display": b"inline-block", "search_disabled": b""},
+    False: {"owner_flag": b"false", "owner_display": b"none", "search_disabled": b"disabled"},
+}
+_AUTH_SLOTS = {
+    True: {"auth_flag": b"true", "auth_display": b"inline-block"},
+    False: {"auth_flag": b"false", "auth_display": b"none"},
+}
+
+
+@cache
+def _user_page_segments() -> tuple[tuple[bytes, Optional[str]], ...]:
+    """ (статический кусок, слот после него); последний кусок без слота. """
+    static = {
+        "cdn_head": html_inject_cdn_head(),
+        "logo_url": escape(data_asset_public_url("other/VVlogo_solo_cr.png"), quote=True),
+    }
+    segments: list[tuple[bytes, Optional[str]]] = []
+    pending = ""
+    for literal, field, _, _ in Formatter().parse(rewrite_asset_urls(USER_PAGE_TEMPLATE)):
+        pending += literal
+        if field is None:
+            continue
+        if field in static:
+            pending += static[field]
+            continue
+        segments.append((pending.encode("utf-8"), field))
+        pending = ""
+    segments.append((pending.encode("utf-8"), None))
+    return tuple(segments)
+
+
+def render_album_cards(albums: Iterable[dict]) -> str:
+    """ Карточки альбомов для серверного рендера первого экрана. """
+    unfound = data_asset_public_url("other/unfound.jpg")
+    return "".join(
+        ALBUM_CARD_TEMPLATE.format(
+            album_id=escape(str(album.get("album_id", "")), quote=True),
+            album_name=escape(album.get("album_name", ""), quote=True),
+            artist_name=escape(album.get("artist_name", ""), quote=True),
+            cover_url=escape(album.get("cover_url") or unfound, quote=True),
+        )
+        for album in albums
+    )
+
+
+def _json_script(data: Any) -> bytes:
+    """ JSON внутри <script>: "<", ">" и "&" как \\u-последовательности, чтобы строка не закрыла тег. """
+    payload = orjson.dumps(data).replace(b"<", b"\\u003c").replace(b">", b"\\u003e").replace(b"&", b"\\u0026")
+    return b'<script id="vv-initial-data" type="application/json">' + payload + b"</script>"
+
+
+def render_user_page(
+    username: str,
+    avatar_url: str | None = None,
+    *,
+    is_owner: bool = False,
+    is_authenticated: bool = False,
+    albums: Sequence[dict] = (),
+    initial_data: Optional[dict] = None,
+) -> bytes:
+    username_html = escape(username, quote=True).encode("utf-8")
+    avatar_url = coalesce_avatar_url(avatar_url)
+    srcset = avatar_srcset(avatar_url)
+    slots = {
+        **_OWNER_SLOTS[is_owner],
+        **_AUTH_SLOTS[is_authenticated],
+        "username": username_html,
+        "profile_path": b"/user/" + username_html,
+        "avatar_url": escape(avatar_url, quote=True).encode("utf-8"),
+        "avatar_srcset": (
+            f' srcset="{escape(srcset, quote=True)}" sizes="{AVATAR_DISPLAY_SIZE}px"'.encode("utf-8") if srcset else b""
+        ),
+        "album_cards": render_album_cards(albums).encode("utf-8") if albums else b"",
+        "initial_data": _json_script(initial_data) if initial_data is not None else b"",
+    }
+    parts: list[bytes] = []
+    for chunk, slot in _user_page_segments():
+        parts.append(chunk)
+        if slot is not None:
+            parts.append(slots[slot])
+    return b"".join(parts)
+
+
+@cache
+def user_page_template_version() -> str:
+    """ Отпечаток шаблона и адресов CDN (входит в ETag страницы): меняется с деплоем, одинаков во всех воркерах. """
+    digest = hashlib.blake2b(digest_size=6)
+    for chunk, slot in _user_page_segments():
+        digest.update(chunk)
+        digest.update((slot or "").encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,43 @@
+"""Отчёт по формату хэшей паролей: сколько учёток ещё не перешли на SHA-256 + bcrypt и текущую стоимость.
+
+Запись помечается password_prehashed=True при регистрации или после первого успешного входа
+(старый хэш при этом перехэшируется). Когда неподтверждённых записей не останется,
+запасную проверку старого формата в verify_password можно убрать.
+
+Запуск: python -m src.password_hash_report
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from src.config import cfg
+from src.database import close_database, init_database
+from src.users_repository import get_users_repository
+
+
+async def main() -> None:
+    await init_database()
+    try:
+        users = await get_users_repository()
+        rows = await users.password_format_stats()
+
+        total = sum(row["count"] for row in rows)
+        unconfirmed = sum(row["count"] for row in rows if not row["_id"]["prehashed"])
+        outdated = sum(
+            row["count"] for row in rows
+            if row["_id"]["prehashed"] and str(row["_id"].get("rounds") or "").isdigit()
+            and int(row["_id"]["rounds"]) < cfg.BCRYPT_ROUNDS
+        )
+        print(f"Всего учёток: {total}")
+        print(f"Формат не подтверждён (возможно, старый bcrypt без pre-hash): {unconfirmed}")
+        print(f"Pre-hash, но стоимость ниже BCRYPT_ROUNDS={cfg.BCRYPT_ROUNDS}: {outdated}")
+        for row in rows:
+            fmt = "sha256+bcrypt" if row["_id"]["prehashed"] else "не подтверждён"
+            print(f"  {fmt:<16} rounds={row['_id'].get('rounds')}: {row['count']}")
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Кэш поиска Last.fm в два уровня: L1 — TTLCache процесса, L2 — общая коллекция Mongo (опционально).
+
+Stale-while-revalidate: после мягкого TTL запись ещё отдаётся сразу, а свежая версия запрашивается в фоне.
+Запись пропадает только после жёсткого TTL; пока Last.fm сбоит, до этого срока отдаётся устаревшая.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from pydantic import TypeAdapter
+
+from src.config import cfg
+from src.database import get_search_cache_collection
+from src.utils.logger import logger
+from src.utils.ttl_cache import TTLCache
+
+CACHE_FRESH = "fresh"
+CACHE_STALE = "stale"
+CACHE_MISS = "miss"
+
+
+class SearchCache:
+    def __init__(
+        self,
+        namespace: str,
+        value_type: Any,
+        ttl_sec: float,
+        stale_ttl_sec: float = 0,
+        max_size: int = 500,
+    ):
+        self._namespace = namespace
+        self._adapter = TypeAdapter(value_type)
+        self._ttl_sec = ttl_sec
+        # stale_ttl_sec <= ttl_sec выключает режим: запись умирает, как только перестаёт быть свежей
+        self._hard_ttl_sec = max(ttl_sec, stale_ttl_sec)
+        # В L1 лежит (fresh_until, value); fresh_until — wall clock, чтобы совпадать с L2
+        self.local = TTLCache(ttl_sec=self._hard_ttl_sec, max_size=max_size)
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self.fresh = 0
+        self.stale = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    def _doc_id(self, key: str) -> str:
+        return f"{self._namespace}:{key}"
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> tuple[Any, str]:
+        """Значение и его статус: fresh, stale (обновляется в фоне) или miss (ждали fetch)."""
+        entry = await self._lookup(key)
+        if entry is not None:
+            fresh_until, value = entry
+            if fresh_until > time.time():
+                self.fresh += 1
+                return value, CACHE_FRESH
+            self.stale += 1
+            self._schedule_refresh(key, fetch)
+            return value, CACHE_STALE
+
+        self.misses += 1
+        value = await fetch()
+        await self.set(key, value)
+        return value, CACHE_MISS
+
+    async def set(self, key: str, value: Any) -> None:
+        fresh_until = time.time() + self._ttl_sec
+        self.local.set(key, (fresh_until, value))
+        if not cfg.SEARCH_CACHE_MONGO:
+            return
+        try:
+            collection = await get_search_cache_collection()
+            await collection.replace_one(
+                {"_id": self._doc_id(key)},
+                {
+                    "value": self._adapter.dump_python(value, mode="json"),
+                    "fresh_until": fresh_until,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self._hard_ttl_sec),
+                },
+                upsert=True,
+            )
+        except Exception as exc:
+            logger.warning(f"Не удалось записать кэш поиска в Mongo ({self._namespace}): {exc}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "fresh": self.fresh,
+            "stale": self.stale,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing),
+            **{f"l1_{k}": v for k, v in self.local.stats().items()},
+        }
+
+    async def _lookup(self, key: str) -> Optional[tuple[float, Any]]:
+        entry = self.local.get(key)
+        if entry is not None or not cfg.SEARCH_CACHE_MONGO:
+            return entry
+        try:
+            collection = await get_search_cache_collection()
+            # TTL-монитор Mongo чистит раз в минуту, поэтому срок проверяем и в запросе
+            doc = await collection.find_one(
+                {"_id": self._doc_id(key), "expires_at": {"$gt": datetime.now(timezone.utc)}}
+            )
+            if not doc:
+                return None
+            entry = (float(doc.get("fresh_until", 0)), self._adapter.validate_python(doc["value"]))
+            expires_at = doc["expires_at"]
+            if expires_at.tzinfo is None:  # motor без tz_aware отдаёт naive UTC
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+        except Exception as exc:
+            logger.warning(f"Кэш поиска в Mongo недоступен ({self._namespace}): {exc}")
+            return None
+        # В L1 запись живёт не дольше, чем в Mongo: иначе устаревшее отдавалось бы дольше жёсткого TTL
+        self.local.set(key, entry, ttl_sec=(expires_at - datetime.now(timezone.utc)).total_seconds())
+        return entry
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+        # Ссылку на задачу держим сами: иначе её может собрать GC до завершения
+        task = asyncio.create_task(self._refresh(key, fetch))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            value = await fetch()
+        except Exception as exc:
+            # Устаревшая запись остаётся до жёсткого TTL
+            self.refresh_errors += 1
+            logger.warning(f"Фоновое обновление кэша поиска не удалось ({self._namespace}:{key}): {exc}")
+            return
+        await self.set(key, value)
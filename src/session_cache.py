@@ -0,0 +1,51 @@
+"""Кэш сессий в памяти процесса: авторизованные запросы не ходят в Mongo за каждой кукой.
+
+Срок записи короткий (SESSION_CACHE_TTL_SEC) и не выходит за жизнь самой сессии (SESSION_TTL_SEC).
+Неизвестные session_id кэшируются отдельно, чтобы мусорные куки не вытесняли живые сессии.
+logout сбрасывает запись сразу; в других воркерах она доживает не дольше SESSION_CACHE_TTL_SEC.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from src.config import cfg
+from src.utils.ttl_cache import TTLCache
+
+SESSION_CACHE = TTLCache(ttl_sec=min(cfg.SESSION_CACHE_TTL_SEC, cfg.SESSION_TTL_SEC), max_size=10_000)
+UNKNOWN_SESSION_CACHE = TTLCache(ttl_sec=min(cfg.SESSION_CACHE_TTL_SEC, cfg.SESSION_TTL_SEC), max_size=10_000)
+
+
+def _is_expired(session: dict) -> bool:
+    login_time = session.get("login_time")
+    if not isinstance(login_time, datetime):
+        return False
+    if login_time.tzinfo is None:
+        login_time = login_time.replace(tzinfo=timezone.utc)
+    return login_time + timedelta(seconds=cfg.SESSION_TTL_SEC) <= datetime.now(timezone.utc)
+
+
+async def resolve_session(collection: AsyncIOMotorCollection, session_id: str) -> dict:
+    """Сессия по id из кэша или Mongo; {} — сессии нет."""
+    session = SESSION_CACHE.get(session_id)
+    if session is not None:
+        if not _is_expired(session):
+            return session
+        SESSION_CACHE.delete(session_id)
+        return {}
+    if UNKNOWN_SESSION_CACHE.get(session_id) is not None:
+        return {}
+
+    session = await collection.find_one({"session_id": session_id}, {"_id": 0})
+    if not session or _is_expired(session):
+        UNKNOWN_SESSION_CACHE.set(session_id, True)
+        return {}
+    SESSION_CACHE.set(session_id, session)
+    return session
+
+
+def invalidate_session(session_id: str) -> None:
+    SESSION_CACHE.delete(session_id)
+    UNKNOWN_SESSION_CACHE.delete(session_id)
@@ -0,0 +1,152 @@
+"""JS и CSS с отпечатком содержимого: /assets/script.<hash>.js.
+
+Сборка идёт при старте процесса: CSS сжимается (комментарии и пробелы), относительные url() в CSS
+переводятся на /static/, считается хэш, готовятся gzip и brotli (если установлен пакет brotli).
+Манифест "script.js" → "/assets/script.<hash>.js" подставляется в HTML (страницы из web/website и /user/...),
+поэтому ответ по хэшированному адресу можно кэшировать навсегда (Cache-Control: immutable).
+Кроме файлов web/website сюда же собирается vv-data-theme.css — CSS-переменные с адресами CDN.
+JS не минифицируется: без парсера это небезопасно, а основной выигрыш даёт сжатие.
+TEMPLATES_AUTO_RELOAD=true (разработка): хэши не используются, HTML ссылается на /static/ как раньше.
+
+Манифест текущей сборки: python -m src.static_assets
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+
+from src.config import cfg
+from src.utils.http_cache import compressed_variants, etag_matches, make_etag, not_modified, pick_encoding
+from src.utils.logger import logger
+
+ASSET_FILES = ("script.js", "form-error.js", "styles.css")
+THEME_CSS = "vv-data-theme.css"
+ASSETS_URL_PREFIX = "/assets/"
+IMMUTABLE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept-Encoding"}
+# Адрес без хэша (старые страницы, режим разработки): недолгий кэш с проверкой по ETag
+UNVERSIONED_HEADERS = {"Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+MEDIA_TYPES = {".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,])\s*")
+_CSS_RELATIVE_URL_RE = re.compile(r"""url\((['"]?)(?!['"]|[a-z]+:|/|#)""", re.IGNORECASE)
+
+
+def minify_css(css: str) -> str:
+    """Консервативно: без комментариев и лишних пробелов; пробелы вокруг ":" не трогаем (".a :hover")."""
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _CSS_SPACE_RE.sub(" ", css)
+    return _CSS_PUNCT_RE.sub(r"\1", css).replace(";}", "}").strip()
+
+
+class CompiledAsset:
+    __slots__ = ("body", "url", "media_type", "variants")
+
+    def __init__(self, name: str, body: bytes):
+        stem, suffix = Path(name).stem, Path(name).suffix
+        if suffix == ".css":
+            # Файл переезжает из /static/ в /assets/: относительные url() указываем от /static/
+            css = _CSS_RELATIVE_URL_RE.sub(r"url(\1/static/", body.decode("utf-8"))
+            body = minify_css(css).encode("utf-8")
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.body = body
+        self.url = f"{ASSETS_URL_PREFIX}{stem}.{digest}{suffix}"
+        self.media_type = MEDIA_TYPES.get(suffix, "application/octet-stream")
+        # encoding → (ETag, байты), как у HTML-страниц
+        self.variants: dict[str, tuple[str, bytes]] = {
+            encoding: (make_etag(digest) if encoding == "identity" else make_etag(digest, encoding), data)
+            for encoding, data in compressed_variants(body).items()
+        }
+
+
+ASSETS: dict[str, CompiledAsset] = {}  # имя файла с хэшем → сборка
+SOURCES: dict[str, CompiledAsset] = {}  # исходное имя → сборка
+MANIFEST: dict[str, str] = {}  # "script.js" → "/assets/script.<hash>.js"
+
+
+def _generated_sources() -> dict[str, bytes]:
+    """Файлы, которых нет на диске."""
+    from src.cdn.data_cdn import build_vv_theme_css  # data_cdn сам импортирует этот модуль
+
+    return {THEME_CSS: build_vv_theme_css().encode("utf-8")}
+
+
+def build_assets(directory: Optional[Path] = None) -> None:
+    """Собирает ASSET_FILES и сгенерированные файлы (вызывается при старте приложения, до сборки HTML)."""
+    directory = directory or cfg.WEBSITE_DIR
+    sources: dict[str, bytes] = {}
+    for name in ASSET_FILES:
+        path = directory / name
+        if not path.is_file():
+            logger.warning(f"Статика не найдена: {path}")
+            continue
+        sources[name] = path.read_bytes()
+    sources.update(_generated_sources())
+
+    ASSETS.clear()
+    SOURCES.clear()
+    MANIFEST.clear()
+    for name, body in sources.items():
+        asset = CompiledAsset(name, body)
+        ASSETS[asset.url.removeprefix(ASSETS_URL_PREFIX)] = asset
+        SOURCES[name] = asset
+        MANIFEST[name] = asset.url
+    logger.info(f"Статика собрана: {', '.join(MANIFEST.values())}")
+
+
+def _manifest() -> dict[str, str]:
+    if cfg.TEMPLATES_AUTO_RELOAD:
+        return {}
+    if not MANIFEST:
+        build_assets()
+    return MANIFEST
+
+
+def asset_url(name: str) -> str:
+    return _manifest().get(name, f"/static/{name}")
+
+
+def source_asset(name: str) -> CompiledAsset:
+    if not SOURCES:
+        build_assets()
+    return SOURCES[name]
+
+
+def rewrite_asset_urls(html: str) -> str:
+    """Ссылки на /static/<файл> из манифеста заменяются адресом с хэшем."""
+    for name, url in _manifest().items():
+        html = html.replace(f'"/static/{name}"', f'"{url}"')
+    return html
+
+
+def asset_response(request: Request, filename: str) -> Response:
+    asset = ASSETS.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return compiled_asset_response(request, asset, IMMUTABLE_HEADERS)
+
+
+def compiled_asset_response(request: Request, asset: CompiledAsset, cache_headers: dict[str, str]) -> Response:
+    encoding = pick_encoding(request, asset.variants)
+    etag, body = asset.variants[encoding]
+    if any(etag_matches(request, variant_etag) for variant_etag, _ in asset.variants.values()):
+        return not_modified(etag, cache_headers)
+
+    headers = {**cache_headers, "ETag": etag}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
+
+
+if __name__ == "__main__":
+    build_assets()
+    for source, url in MANIFEST.items():
+        asset = ASSETS[url.removeprefix(ASSETS_URL_PREFIX)]
+        sizes = ", ".join(f"{encoding}={len(data)}" for encoding, (_, data) in asset.variants.items())
+        print(f"{source} -> {url} ({sizes})")
@@ -0,0 +1,303 @@
+"""Доступ к users_collection: именованные запросы с проекциями.
+
+Только этот модуль обращается к коллекции пользователей напрямую. Каждый запрос забирает
+ровно те поля, которые нужны вызывающему: шапка профиля не тащит хэш пароля и сотни альбомов.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.results import InsertOneResult
+
+from src.database import get_users_collection
+from src.models import VV_Album, VV_User
+
+# Проекции
+PROFILE_HEADER_FIELDS = {"_id": 0, "user_id": 1, "username": 1, "avatar_url": 1, "revision": 1}
+AUTH_RECORD_FIELDS = {"_id": 0, "user_id": 1, "username": 1, "email": 1, "password": 1, "password_prehashed": 1}
+ALBUMS_FIELDS = {"_id": 0, "user_id": 1, "username": 1, "albums": 1}
+
+# revision растёт при каждом изменении, видимом на странице профиля (альбомы, аватар): на нём строятся ETag.
+# У старых документов поля нет — это ревизия 0.
+REVISION_INC = {"revision": 1}
+
+# Альбомы, отсортированные по order на стороне Mongo, только с полями VV_Album и их значениями по умолчанию:
+# чтению не нужна валидация, результат сразу сериализуется в JSON
+SORTED_ALBUMS_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "revision": {"$ifNull": ["$revision", 0]},
+    "albums": {
+        "$map": {
+            "input": {"$sortArray": {"input": {"$ifNull": ["$albums", []]}, "sortBy": {"order": 1}}},
+            "as": "a",
+            "in": {
+                name: (
+                    f"$$a.{name}" if field.is_required() or field.default_factory
+                    else {"$ifNull": [f"$$a.{name}", field.default]}
+                )
+                for name, field in VV_Album.model_fields.items()
+            },
+        }
+    },
+}
+
+# Массовые правки (скрипты миграции) уходят в bulk_write пачками такого размера
+BULK_BATCH_SIZE = 1000
+
+
+def _same_name(value: str) -> dict:
+    """
+    Совпадение строки без учёта регистра: "OK Computer" и "ok computer" — один альбом.
+    Регулярное выражение, а не collation: запрос с collation не может использовать индекс по user_id
+    (он с простой collation), а $toLower понимает только ASCII.
+    """
+    return {"$regex": f"^{re.escape(value)}$", "$options": "i"}
+
+
+class AlbumCursorError(ValueError):
+    """Альбома из курсора after больше нет в коллекции (удалён из другой вкладки)."""
+
+
+class UsersRepository:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self._collection = collection
+
+    # ___________________________ чтение ___________________________
+
+    async def username_exists(self, username: str) -> bool:
+        return bool(await self._collection.find_one({"username": username}, {"_id": 1}))
+
+    async def email_exists(self, email: str) -> bool:
+        return bool(await self._collection.find_one({"email": email}, {"_id": 1}))
+
+    async def user_exists(self, user_id: str) -> bool:
+        return bool(await self._collection.find_one({"user_id": user_id}, {"_id": 1}))
+
+    async def get_auth_record(self, username: str) -> Optional[dict]:
+        """Всё для проверки пароля и создания сессии, без альбомов."""
+        return await self._collection.find_one({"username": username}, AUTH_RECORD_FIELDS)
+
+    async def get_profile_header_by_username(self, username: str) -> Optional[dict]:
+        return await self._collection.find_one({"username": username}, PROFILE_HEADER_FIELDS)
+
+    async def get_profile_header_by_id(self, user_id: str) -> Optional[dict]:
+        return await self._collection.find_one({"user_id": user_id}, PROFILE_HEADER_FIELDS)
+
+    async def get_albums_by_id(self, user_id: str) -> Optional[dict]:
+        return await self._collection.find_one({"user_id": user_id}, ALBUMS_FIELDS)
+
+    async def get_sorted_albums_by_id(
+        self, user_id: str, limit: Optional[int] = None, after: Optional[str] = None,
+    ) -> Optional[dict]:
+        """
+        Страница альбомов по возрастанию order: {"albums", "total", "has_more", "user_id", "revision"};
+        None — пользователя нет.
+        after — album_id последнего альбома предыдущей страницы.
+        """
+        return await self._get_sorted_albums({"user_id": user_id}, limit, after)
+
+    async def get_sorted_albums_by_username(
+        self, username: str, limit: Optional[int] = None, after: Optional[str] = None,
+    ) -> Optional[dict]:
+        return await self._get_sorted_albums({"username": username}, limit, after)
+
+    async def get_profile_page(self, username: str, limit: int) -> Optional[dict]:
+        """Шапка профиля (username, avatar_url) и первая страница альбомов одним запросом."""
+        return await self._get_sorted_albums({"username": username}, limit, None, extra_fields=("username", "avatar_url"))
+
+    async def _get_sorted_albums(
+        self,
+        match: dict,
+        limit: Optional[int],
+        after: Optional[str],
+        extra_fields: tuple[str, ...] = (),
+    ) -> Optional[dict]:
+        # Начало страницы и $slice считаются на сервере: в ответ уходит только сама страница
+        start: Any = 0
+        if after is not None:
+            start = {"$add": [{"$indexOfArray": ["$albums.album_id", after]}, 1]}
+        page: Any = "$albums"
+        if limit is not None:
+            page = {"$slice": ["$albums", start, limit]}
+        elif after is not None:
+            page = {"$slice": ["$albums", start, {"$max": [{"$size": "$albums"}, 1]}]}
+
+        pipeline = [
+            {"$match": match},
+            {"$limit": 1},
+            {"$project": {**SORTED_ALBUMS_PROJECTION, **dict.fromkeys(extra_fields, 1)}},
+            {"$project": {
+                **dict.fromkeys(extra_fields, 1),
+                "albums": page,
+                "user_id": 1,
+                "revision": 1,
+                "total": {"$size": "$albums"},
+                "has_more": {"$gt": [{"$size": "$albums"}, {"$add": [start, limit or 0]}]} if limit else {"$literal": False},
+                "cursor_found": {"$in": [after, "$albums.album_id"]} if after is not None else {"$literal": True},
+            }},
+        ]
+        docs = await self._collection.aggregate(pipeline).to_list(length=1)
+        if not docs:
+            return None
+        doc = docs[0]
+        if not doc.pop("cursor_found"):
+            raise AlbumCursorError(after)
+        return doc
+
+    async def get_album_ids(self, user_id: str) -> set[str]:
+        doc = await self._collection.find_one({"user_id": user_id}, {"_id": 0, "albums.album_id": 1}) or {}
+        return {album.get("album_id") for album in doc.get("albums", [])}
+
+    async def pick_random_username(self, exclude_username: str | None = None) -> Optional[str]:
+        """Случайный username: сначала среди профилей с альбомами, иначе среди любых."""
+        base: dict = {}
+        if exclude_username:
+            base["username"] = {"$ne": exclude_username}
+
+        for match in ({**base, "albums.0": {"$exists": True}}, base):
+            pipeline = [
+                {"$match": match},
+                {"$sample": {"size": 1}},
+                {"$project": {"_id": 0, "username": 1}},
+            ]
+            docs = await self._collection.aggregate(pipeline).to_list(length=1)
+            if docs and docs[0].get("username"):
+                return docs[0]["username"]
+        return None
+
+    # ___________________________ запись ___________________________
+
+    async def insert(self, user: VV_User) -> InsertOneResult:
+        return await self._collection.insert_one(user.model_dump(by_alias=True))
+
+    async def upgrade_password(self, user_id: str, old_hash: str, fields: dict[str, Any]) -> None:
+        """Фильтр по старому хэшу: если пароль успели сменить, ничего не трогаем."""
+        await self._collection.update_one({"user_id": user_id, "password": old_hash}, {"$set": fields})
+
+    async def set_avatar_url(self, user_id: str, avatar_url: str) -> int:
+        result = await self._collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"avatar_url": avatar_url}, "$inc": REVISION_INC},
+        )
+        return result.matched_count
+
+    async def set_avatar_urls(self, urls: dict[str, str]) -> int:
+        """
+        user_id → avatar_url пачками bulk_write; возвращает число изменённых документов.
+        Где URL уже такой, документ не трогаем: ревизия (и ETag страницы) не меняется зря.
+        """
+        items = list(urls.items())
+        modified = 0
+        for start in range(0, len(items), BULK_BATCH_SIZE):
+            ops = [
+                UpdateOne(
+                    {"user_id": user_id, "avatar_url": {"$ne": url}},
+                    {"$set": {"avatar_url": url}, "$inc": REVISION_INC},
+                )
+                for user_id, url in items[start:start + BULK_BATCH_SIZE]
+            ]
+            result = await self._collection.bulk_write(ops, ordered=False)
+            modified += result.modified_count
+        return modified
+
+    async def replace_avatar_url(self, old_url: str, new_url: str) -> int:
+        result = await self._collection.update_many(
+            {"avatar_url": old_url},
+            {"$set": {"avatar_url": new_url}, "$inc": REVISION_INC},
+        )
+        return result.modified_count
+
+    async def append_album(self, user_id: str, album: VV_Album) -> Optional[int]:
+        """
+        Добавляет альбом последним одной записью и возвращает его order.
+        None — пользователя нет или такая пара (artist, album) уже есть в коллекции.
+        """
+        # Pipeline-апдейт: order и дубликат проверяются на сервере, массив альбомов в Python не читаем.
+        # Значения оборачиваем в $literal, иначе название вида "$uicideboy$" станет путём к полю.
+        new_album = {field: {"$literal": value} for field, value in album.model_dump(exclude={"order"}).items()}
+        new_album["order"] = {"$add": [{"$ifNull": [{"$max": "$albums.order"}, -1]}, 1]}
+        doc = await self._collection.find_one_and_update(
+            {
+                "user_id": user_id,
+                "albums": {"$not": {"$elemMatch": {
+                    "artist_name": _same_name(album.artist_name),
+                    "album_name": _same_name(album.album_name),
+                }}},
+            },
+            [{"$set": {
+                "albums": {"$concatArrays": [{"$ifNull": ["$albums", []]}, [new_album]]},
+                "revision": {"$add": [{"$ifNull": ["$revision", 0]}, 1]},
+            }}],
+            projection={"_id": 0, "albums": {"$slice": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        return doc["albums"][0]["order"]
+
+    async def delete_album(self, user_id: str, album_id: str) -> bool:
+        # album_id в фильтре: без него $inc сработал бы и для несуществующего альбома
+        result = await self._collection.update_one(
+            {"user_id": user_id, "albums.album_id": album_id},
+            {"$pull": {"albums": {"album_id": album_id}}, "$inc": REVISION_INC},
+        )
+        return result.modified_count > 0
+
+    async def set_album_orders(self, user_id: str, orders: dict[str, int]) -> Optional[list[dict]]:
+        """
+        Ставит order всем перечисленным альбомам одной атомарной записью и возвращает альбомы.
+        None — у пользователя нет хотя бы одного album_id (тогда не меняется ничего).
+        """
+        # Фильтр $all проверяет, что все album_id есть у пользователя; arrayFilters ставят order каждому альбому
+        set_fields: dict[str, int] = {}
+        array_filters: list[dict] = []
+        for index, (album_id, new_order) in enumerate(orders.items()):
+            set_fields[f"albums.$[a{index}].order"] = new_order
+            array_filters.append({f"a{index}.album_id": album_id})
+
+        doc = await self._collection.find_one_and_update(
+            {"user_id": user_id, "albums.album_id": {"$all": list(orders)}},
+            {"$set": set_fields, "$inc": REVISION_INC},
+            array_filters=array_filters,
+            projection={"_id": 0, "albums": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        return doc.get("albums", [])
+
+    async def replace_albums(self, user_id: str, albums: list[VV_Album]) -> None:
+        await self._collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"albums": [album.model_dump() for album in albums]}, "$inc": REVISION_INC},
+        )
+
+    # ___________________________ обслуживание ___________________________
+
+    def iter_avatar_urls(self, pattern: str):
+        """Курсор {user_id, avatar_url} по пользователям, чей avatar_url подходит под регулярное выражение."""
+        return self._collection.find({"avatar_url": {"$regex": pattern}}, {"_id": 0, "user_id": 1, "avatar_url": 1})
+
+    async def password_format_stats(self) -> list[dict]:
+        """Число учёток по (подтверждён ли pre-hash, стоимость bcrypt)."""
+        pipeline = [
+            {"$group": {
+                "_id": {
+                    "prehashed": {"$eq": ["$password_prehashed", True]},
+                    # $2b$12$... → "12"
+                    "rounds": {"$arrayElemAt": [{"$split": [{"$ifNull": ["$password", ""]}, "$"]}, 2]},
+                },
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"_id.prehashed": 1, "_id.rounds": 1}},
+        ]
+        return await self._collection.aggregate(pipeline).to_list(length=None)
+
+
+async def get_users_repository() -> UsersRepository:
+    return UsersRepository(await get_users_collection())
@@ -0,0 +1,61 @@
+"""Обработка аватаров: квадратные WebP нескольких размеров без метаданных.
+
+Декодирование идёт в отдельном небольшом пуле потоков, чтобы крупные фото не блокировали event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable
+
+from PIL import Image, ImageOps
+
+from src.config import cfg
+
+# 5 МБ сжатого PNG могут распаковаться в гигабайты: больше этого числа пикселей не декодируем
+AVATAR_MAX_PIXELS = 40_000_000
+WEBP_QUALITY = 82
+
+_AVATAR_EXECUTOR = ThreadPoolExecutor(max_workers=cfg.AVATAR_POOL_SIZE, thread_name_prefix="avatar")
+
+
+class AvatarImageError(ValueError):
+    """Файл с подписью картинки не декодируется (битый, слишком большой)."""
+
+
+def resize_avatar(source: bytes | BinaryIO, sizes: Iterable[int]) -> dict[int, bytes]:
+    """
+    size → WebP size×size: центр кадра, поворот по EXIF; EXIF и прочие метаданные не переносятся.
+    source — байты или файл (Pillow читает его сам, без копии в памяти).
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                raise AvatarImageError("Слишком большое изображение")
+            image.seek(0)  # у GIF берём первый кадр
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise AvatarImageError(str(e)) from e
+
+    variants: dict[int, bytes] = {}
+    for size in sorted(sizes, reverse=True):
+        # Следующий размер считается от предыдущего: меньше работы, качество на таких размерах то же
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+async def make_avatar_variants(source: bytes | BinaryIO, sizes: Iterable[int]) -> dict[int, bytes]:
+    """AvatarImageError — изображение не декодируется."""
+    return await asyncio.get_running_loop().run_in_executor(_AVATAR_EXECUTOR, resize_avatar, source, tuple(sizes))
+
+
+def shutdown_avatar_pool() -> None:
+    _AVATAR_EXECUTOR.shutdown(wait=False, cancel_futures=True)
@@ -1,25 +1,81 @@
-"""Чтение и проверка загружаемых аватаров."""
+"""Проверка загружаемых аватаров без чтения файла в память.
+
+Starlette при разборе формы складывает файл во временный (первый 1 МБ в памяти, дальше на диске).
+UploadSizeLimitMiddleware обрывает слишком большое тело ещё до этого: по Content-Length или,
+если его нет, по счётчику принятых байт. Дальше проверяются точный размер файла и сигнатура
+по первым байтам, а сам файл читает Pillow прямо из временного файла.
+"""
 
 from __future__ import annotations
 
+import os
+import re
+
 from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Самой длинной сигнатуре (WebP: RIFF....WEBP) хватает 12 байт
+SIGNATURE_BYTES = 12
+# Запас на границы и заголовки частей multipart сверх размера самого файла
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_TOO_LARGE = "Файл больше 5 МБ"
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI: POST на path_re с телом больше max_bytes (+ запас multipart) получает 400 до разбора формы."""
+
+    def __init__(self, app: ASGIApp, path_re: re.Pattern[str], max_bytes: int):
+        self.app = app
+        self.path_re = path_re
+        self.max_body = max_bytes + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.path_re.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_body:
+            await JSONResponse({"detail": UPLOAD_TOO_LARGE}, status_code=400)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            # Без Content-Length (chunked) считаем байты сами; исключение ловит обработчик HTTPException
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise HTTPException(status_code=400, detail=UPLOAD_TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+
+    def measure() -> int:
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+        return size
+
+    return await run_in_threadpool(measure)
+
 
-READ_CHUNK_SIZE = 64 * 1024
-
-
-async def read_upload_up_to(file: UploadFile, max_bytes: int) -> bytes:
-    """Читает upload чанками и обрывает чтение, если файл больше лимита."""
-    chunks: list[bytes] = []
-    total = 0
-    while True:
-        chunk = await file.read(READ_CHUNK_SIZE)
-        if not chunk:
-            break
-        total += len(chunk)
-        if total > max_bytes:
-            raise HTTPException(status_code=400, detail="Файл больше 5 МБ")
-        chunks.append(chunk)
-    return b"".join(chunks)
+async def check_upload(file: UploadFile, max_bytes: int) -> str | None:
+    """Тип изображения по сигнатуре (None — не картинка); файл больше лимита — 400. Позиция файла — в начале."""
+    if await _upload_size(file) > max_bytes:
+        raise HTTPException(status_code=400, detail=UPLOAD_TOO_LARGE)
+    await file.seek(0)
+    head = await file.read(SIGNATURE_BYTES)
+    await file.seek(0)
+    return detect_image_content_type(head)
 
 
 def detect_image_content_type(data: bytes) -> str | None:
@@ -0,0 +1,54 @@
+"""ETag, условные GET (If-None-Match → 304) и заранее сжатые варианты ответа."""
+
+from __future__ import annotations
+
+import gzip
+from typing import Iterable
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него сжимаем только gzip
+    brotli = None
+
+
+def make_etag(*parts: object) -> str:
+    """Сильный ETag из частей версии: make_etag(user_id, 7) → "<user_id>.7"."""
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match сравнивается слабо (RFC 9110): W/"x" совпадает с "x"."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    """304 повторяет ETag и заголовки кэширования полного ответа."""
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+
+def compressed_variants(body: bytes, text: bool = True) -> dict[str, bytes]:
+    """identity, gzip и (если установлен brotli) br; gzip без mtime — байты одинаковы от сборки к сборке."""
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, mode=brotli.MODE_TEXT if text else brotli.MODE_GENERIC)
+    return variants
+
+
+def pick_encoding(request: Request, available: Iterable[str]) -> str:
+    """Лучшая кодировка из Accept-Encoding (br, затем gzip) среди доступных; q=0 — отказ от кодировки."""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    available = set(available)
+    return next((enc for enc in ("br", "gzip") if enc in available and enc in accepted), "identity")
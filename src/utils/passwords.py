@@ -2,10 +2,23 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 
 import bcrypt
 
+from src.config import cfg
+
+# bcrypt отпускает GIL на время хэширования, поэтому потоков достаточно; размер пула ограничивает CPU
+_PASSWORD_EXECUTOR = ThreadPoolExecutor(max_workers=cfg.PASSWORD_POOL_SIZE, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+class PasswordPoolBusyError(Exception):
+    """Очередь на bcrypt переполнена: лучше сразу отказать, чем держать запрос."""
+
 
 def _password_digest(plain: str) -> bytes:
     """SHA-256 перед bcrypt: bcrypt принимает максимум 72 байта, digest всегда 32."""
@@ -13,17 +26,59 @@ def _password_digest(plain: str) -> bytes:
 
 
 def hash_password(plain: str) -> str:
-    return bcrypt.hashpw(_password_digest(plain), bcrypt.gensalt()).decode("utf-8")
+    return bcrypt.hashpw(_password_digest(plain), bcrypt.gensalt(rounds=cfg.BCRYPT_ROUNDS)).decode("utf-8")
 
 
-def verify_password(plain: str, hashed: str) -> bool:
+def hash_rounds(hashed: str) -> int:
+    """Стоимость из bcrypt-хэша вида $2b$12$..."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return cfg.BCRYPT_ROUNDS
+
+
+def check_password(plain: str, hashed: str, legacy_possible: bool = True) -> tuple[bool, bool]:
+    """
+    (пароль верный, хэш пора обновить).
+    legacy_possible=False — запись точно с pre-hash: при неверном пароле второй checkpw не нужен.
+    """
     if not hashed:
-        return False
+        return False, False
     try:
         hashed_bytes = hashed.encode("utf-8")
         if bcrypt.checkpw(_password_digest(plain), hashed_bytes):
-            return True
+            return True, hash_rounds(hashed) < cfg.BCRYPT_ROUNDS
         # Старые записи: bcrypt от plain-текста без pre-hash
-        return bcrypt.checkpw(plain.encode("utf-8"), hashed_bytes)
+        if legacy_possible and bcrypt.checkpw(plain.encode("utf-8"), hashed_bytes):
+            return True, True
+        return False, False
     except (ValueError, TypeError):
-        return False
+        return False, False
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return check_password(plain, hashed)[0]
+
+
+async def _run_in_password_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """Выполняет bcrypt в отдельном пуле, чтобы не блокировать event loop."""
+    global _pending
+    if _pending >= cfg.PASSWORD_POOL_SIZE + cfg.PASSWORD_QUEUE_MAX:
+        raise PasswordPoolBusyError("Слишком много одновременных проверок пароля")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_PASSWORD_EXECUTOR, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(plain: str) -> str:
+    return await _run_in_password_pool(hash_password, plain)
+
+
+async def check_password_async(plain: str, hashed: str, legacy_possible: bool = True) -> tuple[bool, bool]:
+    return await _run_in_password_pool(check_password, plain, hashed, legacy_possible)
+
+
+def shutdown_password_pool() -> None:
+    _PASSWORD_EXECUTOR.shutdown(wait=False, cancel_futures=True)
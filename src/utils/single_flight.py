@@ -0,0 +1,39 @@
+"""Single-flight: одновременные одинаковые запросы к внешнему API склеиваются в один."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Первый вызов по ключу запускает factory, остальные ждут тот же результат (или ту же ошибку)."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: отмена одного клиента (закрыл вкладку) не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Ошибку уже получили ожидающие; если все ушли — не пишем "exception was never retrieved"
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+def lastfm_key(method: str, *parts: Any) -> tuple:
+    """Ключ запроса: метод Last.fm + нормализованные аргументы."""
+    return (method, *(str(p).strip().lower() for p in parts))
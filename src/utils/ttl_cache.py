@@ -3,35 +3,84 @@
 from __future__ import annotations
 
 import time
+from collections import OrderedDict
 from typing import Any, Optional
 
 
 class TTLCache:
+    """LRU-кэш с общим TTL: get/set за O(1), просроченные записи убираются лениво."""
+
     def __init__(self, ttl_sec: float, max_size: int = 500):
         self._ttl_sec = ttl_sec
         self._max_size = max_size
-        self._items: dict[str, tuple[float, Any]] = {}
+        # Порядок использования: в начале — то, что дольше всех не читали (кандидат на вытеснение)
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # Порядок записи почти совпадает с порядком истечения: TTL общий, короче бывает только у set(..., ttl_sec).
+        # Такую запись голова очереди может пропустить, но get всё равно проверяет срок сам
+        self._expiry: OrderedDict[str, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
     def get(self, key: str) -> Optional[Any]:
         item = self._items.get(key)
         if item is None:
+            self.misses += 1
             return None
         expires_at, value = item
         if expires_at <= time.monotonic():
-            self._items.pop(key, None)
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
             return None
+        self._items.move_to_end(key)
+        self.hits += 1
         return value
 
-    def set(self, key: str, value: Any) -> None:
-        if len(self._items) >= self._max_size:
-            self._evict()
-        self._items[key] = (time.monotonic() + self._ttl_sec, value)
-
-    def _evict(self) -> None:
+    def set(self, key: str, value: Any, ttl_sec: Optional[float] = None) -> None:
+        """ttl_sec — срок этой записи, если он короче общего (например, остаток срока из L2)."""
         now = time.monotonic()
-        for key in [k for k, (expires_at, _) in self._items.items() if expires_at <= now]:
-            self._items.pop(key, None)
-        # Кэш забит живыми записями — вытесняем самую старую по сроку жизни
-        while len(self._items) >= self._max_size:
-            oldest = min(self._items, key=lambda k: self._items[k][0])
-            self._items.pop(oldest, None)
+        self._expire(now)
+        if key in self._items:
+            self._remove(key)
+        elif len(self._items) >= self._max_size:
+            # Кэш забит живыми записями — вытесняем ту, что дольше всех не читали
+            oldest, _ = self._items.popitem(last=False)
+            self._expiry.pop(oldest, None)
+            self.evictions += 1
+        expires_at = now + (self._ttl_sec if ttl_sec is None else min(ttl_sec, self._ttl_sec))
+        self._items[key] = (expires_at, value)
+        self._expiry[key] = expires_at
+
+    def delete(self, key: str) -> None:
+        self._remove(key)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._expiry.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _remove(self, key: str) -> None:
+        self._items.pop(key, None)
+        self._expiry.pop(key, None)
+
+    def _expire(self, now: float) -> None:
+        # Снимаем просроченные с головы очереди: каждая запись уходит отсюда один раз, в сумме O(1) на set
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
@@ -3,6 +3,14 @@ import httpx
 import requests
 
 from src.config import cfg
+from src.lastfm_api.http_client import build_lastfm_http_client, get_lastfm_http_client
+
+# Коды Last.fm, после которых запрос имеет смысл повторить позже: сбой операции, сервис недоступен, лимит
+LASTFM_TRANSIENT_ERRORS = frozenset({8, 11, 16, 29})
+
+
+class LastFmUnavailableError(Exception):
+    """Last.fm не ответил по сети или временно недоступен (в отличие от «альбом не найден»)."""
 
 
 def send_request(params: dict) -> dict:
@@ -18,17 +26,41 @@ def send_request(params: dict) -> dict:
         return {"error": f"Ошибка запроса: {str(e)}"}
 
 
+async def _get_json(client: httpx.AsyncClient, params: dict) -> dict:
+    response = await client.get(cfg.URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        if data["error"] in LASTFM_TRANSIENT_ERRORS:
+            return {"error": data["message"], "unavailable": True}
+        return {"error": data["message"]}
+    return data
+
+
 async def send_request_async(params: dict) -> dict:
+    """
+    Запрос к Last.fm через общий пул соединений; без lifespan (скрипты) — разовый клиент.
+    Временные сбои помечаются ключом "unavailable": такой ответ не кэшируют.
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(cfg.URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if "error" in data:
-                return {"error": data["message"]}
-            return data
-    except httpx.HTTPError as e:
+        client = get_lastfm_http_client()
+        if client is not None:
+            return await _get_json(client, params)
+        async with build_lastfm_http_client() as client:
+            return await _get_json(client, params)
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
+        if status_code >= 500 or status_code == 429:
+            return {"error": f"Ошибка запроса: {str(e)}", "unavailable": True}
         return {"error": f"Ошибка запроса: {str(e)}"}
+    except httpx.HTTPError as e:
+        return {"error": f"Ошибка запроса: {str(e)}", "unavailable": True}
+
+
+def raise_if_unavailable(data: dict) -> dict:
+    if data.get("unavailable"):
+        raise LastFmUnavailableError(data.get("error", ""))
+    return data
 
 
 def load_html(filename: str, filedir: str) -> str:
@@ -26,11 +26,18 @@ let draggedElement = null;
 let pendingDeletes = new Set();
 let pendingAvatarFile = null;
 let originalAvatarSrc = null;
+let originalAvatarSrcset = null;
 let pendingAvatarObjectUrl = null;
 let currentProfileUserId = null;
 let currentProfileUsername = null;
 let isOwnProfilePage = false;
 
+// Постраничная загрузка альбомов: первая страница сразу, остальные — при прокрутке к концу списка
+const ALBUMS_PAGE_SIZE = 60;
+let albumPages = null; // {baseUrl, fetchOptions, nextAfter, loading}
+let albumPagesObserver = null;
+let albumListEnd = null;
+
 
 //---------------------------------------------------------------------------------------------------------------- UTILS
 
@@ -135,6 +142,41 @@ async function loadPublicProfile(username) {
     return await response.json();
 }
 
+// JSON из <script id="vv-initial-data">: {profile, albums, total, next_after}
+function readInitialData() {
+    const el = document.getElementById('vv-initial-data');
+    if (!el) return null;
+    try {
+        return JSON.parse(el.textContent);
+    } catch (error) {
+        console.error('Встроенные данные профиля не разобраны:', error);
+        return null;
+    }
+}
+
+// Ключ аватара содержит хэш содержимого: новая загрузка — новый URL, обходить кэш CDN не нужно
+function setAvatarImage(img, url, srcset) {
+    img.src = url;
+    if (srcset) {
+        img.srcset = srcset;
+        img.sizes = '150px';
+    } else {
+        img.removeAttribute('srcset');
+    }
+}
+
+// keepAvatar — аватар уже отрисован сервером (гидратация), <img> не трогаем
+function showProfileHeader(profile, { keepAvatar = false } = {}) {
+    const avatarEl = document.getElementById('user-avatar');
+    if (avatarEl && profile.avatar_url && !keepAvatar) {
+        setAvatarImage(avatarEl, profile.avatar_url, profile.avatar_srcset);
+    }
+    const nameEl = document.getElementById('profile-username');
+    if (nameEl && profile.username) {
+        nameEl.textContent = profile.username;
+    }
+}
+
 async function uploadAvatar(file) {
     const user_id = await getUserIdFromSession();
     if (!user_id) {
@@ -190,6 +232,7 @@ function setupAvatarControls() {
         }
         pendingAvatarFile = file;
         pendingAvatarObjectUrl = URL.createObjectURL(file);
+        img.removeAttribute('srcset');
         img.src = pendingAvatarObjectUrl;
     });
 }
@@ -225,6 +268,10 @@ async function sendAlbumToServer(album_search_item) {
         // fetch используется для отправки HTTP-запроса
         const response = await fetch(url, requestOptions);
 
+        // 409: такой альбом уже есть в коллекции (например, добавлен из другой вкладки)
+        if (response.status === 409) {
+            return false;
+        }
         if (!response.ok) {
             throw new Error(`Ошибка: ${response.status}`);
         }
@@ -235,6 +282,7 @@ async function sendAlbumToServer(album_search_item) {
         console.error('Ошибка при добавлении альбома:', error);
         console.log('Не удалось добавить альбом на сервер!');
     }
+    return true;
 }
 
 
@@ -250,19 +298,101 @@ async function searchMixed(query) {
 }
 
 
-// Загрузка альбомов пользователя из базы ( app.get("/api/users/{user_id}/albums/all/", response_model=list[VV_Album]) )
-async function loadUserAlbums(userId) {
-    try {
-        const response = await fetch(`${serverAddress}api/users/${userId}/albums/all/`, { credentials: 'include' });
-        const albums = await response.json();
+// Одна страница альбомов; курсор следующей сервер присылает в заголовке X-Next-After
+async function fetchAlbumPage(pages) {
+    const params = new URLSearchParams({ limit: ALBUMS_PAGE_SIZE });
+    if (pages.nextAfter) params.set('after', pages.nextAfter);
+    const response = await fetch(`${pages.baseUrl}?${params}`, pages.fetchOptions);
+    if (!response.ok) {
+        throw new Error(`Ошибка загрузки альбомов: ${response.status}`);
+    }
+    const albums = await response.json();
+    pages.nextAfter = response.headers.get('X-Next-After');
+    return albums;
+}
 
-        albumList.innerHTML = ''; // Очищаем список перед добавлением новых альбомов
+function appendAlbumCards(albums) {
+    albums.forEach(album => {
+        // Альбом, добавленный через поиск до загрузки последней страницы, уже есть в списке
+        if (albumList.querySelector(`li[data-album-id="${CSS.escape(album.album_id)}"]`)) return;
+        albumList.appendChild(createAlbumCard(album));
+    });
+}
 
-        albums.forEach(album => {
-            const albumCard = createAlbumCard(album);
-            albumList.appendChild(albumCard);
-        });
+// Первая страница пришла вместе с HTML: карточки уже отрисованы сервером, им нужны только обработчики
+function hydrateAlbumList(baseUrl, fetchOptions, initial) {
+    albumPages = { baseUrl, fetchOptions, nextAfter: initial.next_after, loading: null };
+    albumList.querySelectorAll('li[data-album-id]').forEach(li => {
+        bindAlbumCardDelete(li, li.querySelector('.delete-album-button'));
+    });
+    appendAlbumCards(initial.albums); // карточки, которых нет в разметке, дорисуем сами
+    watchAlbumListEnd();
+}
+
+// Загружает первую страницу заново (список очищается) и включает догрузку при прокрутке
+async function loadAlbumList(baseUrl, fetchOptions = {}) {
+    const pages = { baseUrl, fetchOptions, nextAfter: null, loading: null };
+    albumPages = pages;
+    const albums = await fetchAlbumPage(pages);
+    if (albumPages !== pages) return; // список уже перезагружен другим вызовом
+
+    albumList.innerHTML = ''; // Очищаем список перед добавлением новых альбомов
+    appendAlbumCards(albums);
+    watchAlbumListEnd();
+}
+
+function loadNextAlbumPage() {
+    const pages = albumPages;
+    if (!pages || !pages.nextAfter) return Promise.resolve();
+    if (!pages.loading) {
+        pages.loading = fetchAlbumPage(pages)
+            .then(albums => {
+                if (albumPages !== pages) return;
+                appendAlbumCards(albums);
+                watchAlbumListEnd();
+            })
+            .finally(() => {
+                pages.loading = null;
+            });
+    }
+    return pages.loading;
+}
+
+// Догружает все оставшиеся страницы (нужно режиму правки: порядок сохраняется для всей коллекции)
+async function loadAllAlbumPages() {
+    try {
+        while (albumPages && albumPages.nextAfter) {
+            await loadNextAlbumPage();
+        }
+    } catch (error) {
+        console.error('Ошибка догрузки альбомов:', error);
+    }
+}
 
+function watchAlbumListEnd() {
+    if (!('IntersectionObserver' in window)) {
+        loadAllAlbumPages();
+        return;
+    }
+    if (!albumListEnd) {
+        albumListEnd = document.createElement('div');
+        albumListEnd.setAttribute('aria-hidden', 'true');
+        albumList.after(albumListEnd);
+        albumPagesObserver = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextAlbumPage().catch(error => console.error('Ошибка догрузки альбомов:', error));
+            }
+        }, { rootMargin: '600px 0px' });
+    }
+    // Повторный observe сразу сообщает текущее состояние: если конец списка всё ещё виден, грузим дальше
+    albumPagesObserver.unobserve(albumListEnd);
+    albumPagesObserver.observe(albumListEnd);
+}
+
+// Загрузка альбомов пользователя из базы ( app.get("/api/users/{user_id}/albums/all/", response_model=list[VV_Album]) )
+async function loadUserAlbums(userId) {
+    try {
+        await loadAlbumList(`${serverAddress}api/users/${userId}/albums/all/`, { credentials: 'include' });
     } catch (error) {
         console.error("Ошибка загрузки альбомов:", error);
     }
@@ -270,15 +400,7 @@ async function loadUserAlbums(userId) {
 
 async function loadPublicUserAlbums(username) {
     try {
-        const response = await fetch(`${serverAddress}api/profiles/${encodeURIComponent(username)}/albums`);
-        const albums = await response.json();
-
-        albumList.innerHTML = '';
-
-        albums.forEach(album => {
-            const albumCard = createAlbumCard(album);
-            albumList.appendChild(albumCard);
-        });
+        await loadAlbumList(`${serverAddress}api/profiles/${encodeURIComponent(username)}/albums`);
     } catch (error) {
         console.error("Ошибка загрузки публичных альбомов:", error);
     }
@@ -348,6 +470,21 @@ document.addEventListener("DOMContentLoaded", async () => {
             setupLogoutButton();
         }
 
+        // Шапка профиля и первая страница альбомов уже встроены в страницу сервером
+        const initial = readInitialData();
+        if (initial) {
+            currentProfileUserId = initial.profile.user_id;
+            showProfileHeader(initial.profile, { keepAvatar: true });
+            const albumsUrl = isOwnProfilePage
+                ? `${serverAddress}api/users/${currentProfileUserId}/albums/all/`
+                : `${serverAddress}api/profiles/${encodeURIComponent(currentProfileUsername)}/albums`;
+            hydrateAlbumList(albumsUrl, isOwnProfilePage ? { credentials: 'include' } : {}, initial);
+            if (isOwnProfilePage) {
+                setupAvatarControls();
+            }
+            return;
+        }
+
         if (isOwnProfilePage) {
             const userId = await getUserIdFromSession(); // Теперь await работает корректно
             if (!userId) {
@@ -361,14 +498,7 @@ document.addEventListener("DOMContentLoaded", async () => {
                 const profile = await loadUserProfile();
                 if (profile) {
                     currentProfileUserId = profile.user_id || currentProfileUserId;
-                    const avatarEl = document.getElementById('user-avatar');
-                    if (avatarEl && profile.avatar_url) {
-                        avatarEl.src = `${profile.avatar_url}?t=${Date.now()}`;
-                    }
-                    const nameEl = document.getElementById('profile-username');
-                    if (nameEl && profile.username) {
-                        nameEl.textContent = profile.username;
-                    }
+                    showProfileHeader(profile);
                 }
             } catch (e) {
                 console.error('Профиль не загружен:', e);
@@ -378,14 +508,7 @@ document.addEventListener("DOMContentLoaded", async () => {
                 const profile = await loadPublicProfile(currentProfileUsername);
                 if (profile) {
                     currentProfileUserId = profile.user_id || null;
-                    const avatarEl = document.getElementById('user-avatar');
-                    if (avatarEl && profile.avatar_url) {
-                        avatarEl.src = `${profile.avatar_url}?t=${Date.now()}`;
-                    }
-                    const nameEl = document.getElementById('profile-username');
-                    if (nameEl && profile.username) {
-                        nameEl.textContent = profile.username;
-                    }
+                    showProfileHeader(profile);
                 }
             } catch (e) {
                 console.error('Публичный профиль не загружен:', e);
@@ -507,12 +630,7 @@ function createAlbumCard(album) {
     deleteButton.style.left = '5px';
     deleteButton.textContent = '❌';
     deleteButton.style.display = isEditMode ? 'block' : 'none'; // Скрываем кнопку по умолчанию
-    deleteButton.onclick = (event) => {
-        event.stopPropagation();
-        if (!isEditMode) return;
-        pendingDeletes.add(album.album_id);
-        li.remove();
-    };
+    bindAlbumCardDelete(li, deleteButton);
 
     // Собираем карточку
     cardBody.appendChild(albumTitle);
@@ -526,6 +644,17 @@ function createAlbumCard(album) {
 }
 
 
+function bindAlbumCardDelete(li, deleteButton) {
+    if (!deleteButton) return;
+    deleteButton.onclick = (event) => {
+        event.stopPropagation();
+        if (!isEditMode) return;
+        pendingDeletes.add(li.dataset.albumId);
+        li.remove();
+    };
+}
+
+
 // Добавление альбома на витрину при выборе варианта из выпадающего списка найденных альбомов
 function addAlbumBySearchGrouped(result) {
     LfmSearchDropdownMenu.innerHTML = '';
@@ -583,7 +712,9 @@ function addAlbumBySearchGrouped(result) {
                     const li = createAlbumCard(album);
                     albumList.appendChild(li);
                     albumSearchInput.value = '';
-                    sendAlbumToServer(album);
+                    sendAlbumToServer(album).then((added) => {
+                        if (!added) li.remove();
+                    });
                     LfmSearchDropdownMenu.style.display = 'none';
                 });
             }
@@ -663,8 +794,10 @@ function setSearchEnabled(enabled) {
     }
 }
 
-function enableEditMode() {
-    if (!isOwnProfilePage) return;
+async function enableEditMode() {
+    if (!isOwnProfilePage || isEditMode) return;
+    await loadAllAlbumPages();
+    if (isEditMode) return; // повторный клик, пока догружались страницы
     isEditMode = true;
     editBtn.style.display = 'none';
     saveCancelControls.style.display = 'flex';
@@ -675,6 +808,7 @@ function enableEditMode() {
     pendingAvatarFile = null;
     const avatarImg = document.getElementById('user-avatar');
     originalAvatarSrc = avatarImg ? avatarImg.src : null;
+    originalAvatarSrcset = avatarImg ? avatarImg.getAttribute('srcset') : null;
     
     // Сохраняем оригинальный порядок
     originalOrder = Array.from(albumList.children).map(li => ({
@@ -882,7 +1016,7 @@ async function saveAlbumOrder() {
             const data = await uploadAvatar(pendingAvatarFile);
             const avatarImg = document.getElementById('user-avatar');
             if (avatarImg && data && data.avatar_url) {
-                avatarImg.src = `${data.avatar_url}?t=${Date.now()}`;
+                setAvatarImage(avatarImg, data.avatar_url, data.avatar_srcset);
             }
         } catch (error) {
             console.error('Ошибка при загрузке аватара:', error);
@@ -907,6 +1041,7 @@ function cancelEdit() {
     const avatarImg = document.getElementById('user-avatar');
     if (avatarImg && originalAvatarSrc) {
         avatarImg.src = originalAvatarSrc;
+        if (originalAvatarSrcset) avatarImg.setAttribute('srcset', originalAvatarSrcset);
     }
     if (pendingAvatarObjectUrl) {
         URL.revokeObjectURL(pendingAvatarObjectUrl);